@@ -0,0 +1,159 @@
+import hashlib
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterable, Optional
+
+from auto_i18n.config import CONFIG_FILE, get_global_config_value
+
+CACHE_FILE = CONFIG_FILE.parent / 'translation-cache.sqlite3'
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+def hash_text(*parts: str) -> str:
+    digest = hashlib.sha1()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+
+class TranslationCache:
+    """翻译记忆库, 以 (原文, 目标文件/语言, 模型, prompt 哈希) 为键保存翻译结果"""
+
+    def __init__(self, path: Path = CACHE_FILE):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS translations (
+                source TEXT NOT NULL,
+                target TEXT NOT NULL,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                translation TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                used_at REAL NOT NULL,
+                PRIMARY KEY (source, target, model, prompt_hash)
+            )
+            """
+        )
+        self._conn.commit()
+
+    def get_many(
+        self, sources: Iterable[str], target: str, model: str, prompt_hash: str
+    ) -> dict[str, str]:
+        sources = list(dict.fromkeys(sources))
+        found = {}
+        now = time.time()
+        with self._lock:
+            for source in sources:
+                row = self._conn.execute(
+                    'SELECT translation FROM translations '
+                    'WHERE source = ? AND target = ? AND model = ? AND prompt_hash = ?',
+                    (source, target, model, prompt_hash),
+                ).fetchone()
+                if row is not None:
+                    found[source] = row[0]
+            if found:
+                self._conn.executemany(
+                    'UPDATE translations SET used_at = ? '
+                    'WHERE source = ? AND target = ? AND model = ? AND prompt_hash = ?',
+                    [(now, s, target, model, prompt_hash) for s in found],
+                )
+                self._conn.commit()
+        return found
+
+    def get(self, source: str, target: str, model: str, prompt_hash: str):
+        return self.get_many([source], target, model, prompt_hash).get(source)
+
+    def put_many(
+        self,
+        pairs: Iterable[tuple[str, str]],
+        target: str,
+        model: str,
+        prompt_hash: str,
+    ):
+        now = time.time()
+        rows = [
+            (source, target, model, prompt_hash, translation, now, now)
+            for source, translation in pairs
+        ]
+        if not rows:
+            return
+        with self._lock:
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO translations VALUES (?, ?, ?, ?, ?, ?, ?)', rows
+            )
+            self._conn.commit()
+
+    def put(
+        self, source: str, translation: str, target: str, model: str, prompt_hash: str
+    ):
+        self.put_many([(source, translation)], target, model, prompt_hash)
+
+    def stats(self) -> dict:
+        with self._lock:
+            count, oldest, newest = self._conn.execute(
+                'SELECT COUNT(*), MIN(created_at), MAX(used_at) FROM translations'
+            ).fetchone()
+            targets = self._conn.execute(
+                'SELECT COUNT(DISTINCT target) FROM translations'
+            ).fetchone()[0]
+        return {
+            'file': str(self.path),
+            'size': self.path.stat().st_size if self.path.exists() else 0,
+            'entries': count,
+            'targets': targets,
+            'oldest': oldest,
+            'newest': newest,
+        }
+
+    def prune(
+        self, max_entries: Optional[int] = None, max_age_days: Optional[float] = None
+    ) -> int:
+        """删除超过 max_age_days 天未使用的条目, 然后按最近使用时间只保留 max_entries 条"""
+        removed = 0
+        with self._lock:
+            if max_age_days is not None:
+                deadline = time.time() - max_age_days * SECONDS_PER_DAY
+                removed += self._conn.execute(
+                    'DELETE FROM translations WHERE used_at < ?', (deadline,)
+                ).rowcount
+            if max_entries is not None:
+                removed += self._conn.execute(
+                    'DELETE FROM translations WHERE rowid NOT IN '
+                    '(SELECT rowid FROM translations ORDER BY used_at DESC LIMIT ?)',
+                    (max_entries,),
+                ).rowcount
+            self._conn.commit()
+        return removed
+
+    def clear(self) -> int:
+        with self._lock:
+            removed = self._conn.execute('DELETE FROM translations').rowcount
+            self._conn.commit()
+            self._conn.execute('VACUUM')
+        return removed
+
+    def close(self):
+        self._conn.close()
+
+
+def get_cache() -> Optional[TranslationCache]:
+    """根据全局配置打开翻译记忆库, 未启用时返回 None"""
+    if not get_global_config_value('cache.enabled', True):
+        return None
+    return TranslationCache()
+
+
+def prune_cache(cache: TranslationCache) -> int:
+    """按照全局配置中的 cache.max_entries 和 cache.max_age_days 清理缓存"""
+    return cache.prune(
+        get_global_config_value('cache.max_entries', 100000),
+        get_global_config_value('cache.max_age_days', 90),
+    )
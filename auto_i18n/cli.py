@@ -5,33 +5,54 @@ import yaml
 
 from auto_i18n.config import (
     get_config_value,
+    get_global_config_value,
     get_project_config_value,
     init_global_config,
     init_project_config,
     list_config,
     set_config_value,
 )
-from auto_i18n.export import export_i18n
-from auto_i18n.extract import extract_i18n
-from auto_i18n.gpt import send_gpt_request
 from auto_i18n.i18n import i18n
-from auto_i18n.translate import translate_file, translate_i18n
-from auto_i18n.utils import echo
+from auto_i18n.utils import PROFILER, echo
+
+# NOTE: 各个命令的实现 (以及 requests 等较重的依赖) 在命令内部按需导入, 以加快 CLI 的启动速度
 
 # Initialize i18n
 I18N = i18n()
 
 
 @click.group(help=I18N.cli.help)
-def cli():
+@click.option('--profile', is_flag=True, default=False, help=I18N.cli_py.profile)
+@click.option(
+    '--profile-json',
+    type=click.Path(dir_okay=False),
+    default=None,
+    help=I18N.cli_py.profilejson,
+)
+@click.pass_context
+def cli(ctx, profile, profile_json):
     """
     auto-i18n: A CLI tool for managing i18n in your projects.
     """
     click.echo(click.style(I18N.cli.description, fg='green', bold=True))
     click.echo(I18N.cli.help)
+    if profile or profile_json:
+        PROFILER.enable()
+        # 命令执行结束 (包括出错退出) 之后输出统计结果
+        ctx.call_on_close(lambda: report_profile(profile_json))
     init_global_config()
 
 
+def report_profile(json_file=None):
+    click.echo(click.style(I18N.cli_py.profilereport, fg='blue', bold=True), err=True)
+    click.echo(PROFILER.report(), err=True)
+    if json_file:
+        from auto_i18n import io
+
+        io.write_json(json_file, PROFILER.summary())
+        click.echo(I18N.cli_py.profilesaved + str(json_file), err=True)
+
+
 @cli.command(help=I18N.init.help)
 @click.option(
     '--overwrite', is_flag=True, default=False, help=I18N.cli_py.force_cover_config
@@ -48,13 +69,24 @@ def init(overwrite):
 
 @cli.command(help=I18N.translate.help)
 @click.option('--full/--diff', default=None)
-def translate(full):
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(min=1),
+    default=None,
+    help=I18N.translate.options.jobs,
+)
+@click.option('--multi/--single', default=None, help=I18N.translate.options.multi)
+@click.option('--resume', is_flag=True, default=False, help=I18N.cli_py.resume)
+def translate(full, jobs, multi, resume):
     """Translate i18n files."""
     click.echo(click.style(I18N.translate.description, fg='blue', bold=True))
     click.echo(I18N.translate.help)
     click.echo(I18N.translate.options.full if full else I18N.translate.options.diff)
     click.echo(click.style(I18N.translate.start, fg='yellow'))
-    translate_i18n(full)
+    from auto_i18n.translate import translate_i18n
+
+    translate_i18n(full, jobs, multi, resume)
 
 
 @cli.command(name='translate-file', help=I18N.cli_py.specifyinputfile)
@@ -73,21 +105,70 @@ def translate(full):
     help=I18N.cli_py.specifyoutputfilepath,
 )
 @click.option('--lang', default='English', help=I18N.cli_py.specifytargetlang)
-def translate_file_cmd(in_file: str, out_file: str, lang: str = 'English'):
+@click.option('--chunked', is_flag=True, default=False, help=I18N.cli_py.chunked)
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(min=1),
+    default=None,
+    help=I18N.cli_py.jobs,
+)
+def translate_file_cmd(
+    in_file: str,
+    out_file: str,
+    lang: str = 'English',
+    chunked: bool = False,
+    jobs: int = None,
+):
     """Translate i18n files."""
     echo.info(f'"{in_file}" --> "{out_file}"[{lang}]')
-    translate_file(in_file, out_file, lang)
+    from auto_i18n.translate import translate_file
+
+    translate_file(in_file, out_file, lang, chunked, jobs)
 
 
 @cli.command(help=I18N.extract.help)
 @click.option('--dir', default='.', help=I18N.extract.options.dir)
-def extract(dir):
+@click.option(
+    '--jobs',
+    '-j',
+    type=click.IntRange(min=1),
+    default=None,
+    help=I18N.extract.options.jobs,
+)
+@click.option('--batch/--no-batch', default=None, help=I18N.extract.options.batch)
+@click.option('--force', is_flag=True, default=False, help=I18N.extract.options.force)
+@click.option(
+    '--scan-workers',
+    type=click.IntRange(min=0),
+    default=None,
+    help=I18N.extract.options.scanworkers,
+)
+@click.option('--plan', is_flag=True, default=False, help=I18N.extract.options.plan)
+@click.option('--apply', is_flag=True, default=False, help=I18N.extract.options.apply)
+@click.option(
+    '--plan-file',
+    type=click.Path(dir_okay=False),
+    default='auto-i18n.plan.json',
+    help=I18N.extract.options.planfile,
+)
+@click.option('--resume', is_flag=True, default=False, help=I18N.cli_py.resume)
+def extract(dir, jobs, batch, force, scan_workers, plan, apply, plan_file, resume):
     """Extract i18n text from code files."""
+    if plan and apply:
+        raise click.UsageError(I18N.extract.planandapply)
     click.echo(click.style(I18N.extract.description, fg='blue', bold=True))
     click.echo(I18N.extract.help)
     click.echo(I18N.extract.options.dir.format(directory=dir))
     click.echo(click.style(I18N.extract.start, fg='yellow'))
-    extract_i18n(dir)
+    from auto_i18n.extract import apply_extract_plan, extract_i18n
+
+    if apply:
+        apply_extract_plan(plan_file)
+        return
+    extract_i18n(
+        dir, jobs, batch, force, scan_workers, plan_file if plan else None, resume
+    )
 
 
 @cli.command(help=I18N.testgpt.help)
@@ -96,6 +177,8 @@ def testgpt():
     click.echo(click.style(I18N.testgpt.description, fg='blue', bold=True))
     click.echo(I18N.testgpt.help)
     click.echo(click.style(I18N.testgpt.start, fg='yellow'))
+    from auto_i18n.gpt import send_gpt_request
+
     res = send_gpt_request('Hello, how are you?')
     if res:
         click.echo(click.style(I18N.testgpt.success.format(response=res), fg='green'))
@@ -207,46 +290,28 @@ def config_set(is_global, is_project, key, value):
     )
 
 
-@config.command(
-    'edit',
-    help=I18N.config.edit.help
-    if hasattr(I18N.config, 'edit')
-    else 'Edit the configuration file directly',
-)
+@config.command('edit', help=I18N.config.edit.help)
 @click.option(
     '--global',
     'is_global',
     is_flag=True,
     default=False,
-    help=I18N.config.edit.options['global']
-    if hasattr(I18N.config, 'edit')
-    else 'Edit the global configuration file',
+    help=I18N.config.edit.options['global'],
 )
 @click.option(
     '--project',
     'is_project',
     is_flag=True,
     default=False,
-    help=I18N.config.edit.options['project']
-    if hasattr(I18N.config, 'edit')
-    else 'Edit the project configuration file',
+    help=I18N.config.edit.options['project'],
 )
 def config_edit(is_global, is_project):
     """Edit the configuration file directly."""
-    if hasattr(I18N.config, 'edit'):
-        click.echo(click.style(I18N.config.edit.description, fg='blue', bold=True))
-        click.echo(I18N.config.edit.help)
-    else:
-        click.echo(click.style('Edit Configuration', fg='blue', bold=True))
-        click.echo('Edit the configuration file directly with your system editor.')
+    click.echo(click.style(I18N.config.edit.description, fg='blue', bold=True))
+    click.echo(I18N.config.edit.help)
 
     if is_global == is_project:
-        error_msg = (
-            I18N.config.edit.error.specify
-            if hasattr(I18N.config, 'edit') and hasattr(I18N.config.edit, 'error')
-            else 'Please specify either --global or --project'
-        )
-        click.echo(click.style(error_msg, fg='red'))
+        click.echo(click.style(I18N.config.edit.error.specify, fg='red'))
         return
 
     import os
@@ -265,12 +330,9 @@ def config_edit(is_global, is_project):
 
     # Ensure the file exists
     if not os.path.exists(config_file):
-        error_msg = (
-            I18N.config.edit.error.not_found.format(file=config_file)
-            if hasattr(I18N.config, 'edit') and hasattr(I18N.config.edit, 'error')
-            else f'Config file not found: {config_file}'
+        click.echo(
+            click.style(I18N.config.edit.error.not_found.format(file=config_file), fg='red')
         )
-        click.echo(click.style(error_msg, fg='red'))
         return
 
     # Open the file with the system's default editor
@@ -284,19 +346,77 @@ def config_edit(is_global, is_project):
             editor = os.environ.get('EDITOR', 'vi')
             subprocess.run([editor, config_file], check=True)
 
-        success_msg = (
-            I18N.config.edit.success
-            if hasattr(I18N.config, 'edit')
-            else f'Opened config file for editing: {config_file}'
+        click.echo(
+            click.style(I18N.config.edit.success.format(file=config_file), fg='green')
         )
-        click.echo(click.style(success_msg, fg='green'))
     except Exception as e:
-        error_msg = (
-            I18N.config.edit.error.failed.format(error=str(e))
-            if hasattr(I18N.config, 'edit') and hasattr(I18N.config.edit, 'error')
-            else f'Failed to open config file: {str(e)}'
+        click.echo(
+            click.style(I18N.config.edit.error.failed.format(error=str(e)), fg='red')
         )
-        click.echo(click.style(error_msg, fg='red'))
+
+
+@cli.group(help=I18N.cache.help)
+def cache():
+    """Manage the translation memory cache."""
+    click.echo(click.style(I18N.cache.description, fg='blue', bold=True))
+
+
+@cache.command('stats', help=I18N.cache.stats.help)
+def cache_stats():
+    """Show statistics of the translation memory cache."""
+    from datetime import datetime
+
+    from auto_i18n.cache import TranslationCache
+
+    translation_cache = TranslationCache()
+    stats = translation_cache.stats()
+    translation_cache.close()
+    for field in ['oldest', 'newest']:
+        if stats[field] is not None:
+            stats[field] = datetime.fromtimestamp(stats[field]).isoformat(
+                sep=' ', timespec='seconds'
+            )
+    click.echo(yaml.dump(stats, allow_unicode=True, sort_keys=False))
+
+
+@cache.command('prune', help=I18N.cache.prune.help)
+@click.option(
+    '--max-entries',
+    type=click.IntRange(min=0),
+    default=None,
+    help=I18N.cache.prune.options.max_entries,
+)
+@click.option(
+    '--max-age-days',
+    type=click.FloatRange(min=0),
+    default=None,
+    help=I18N.cache.prune.options.max_age_days,
+)
+def cache_prune(max_entries, max_age_days):
+    """Evict old or least recently used cache entries."""
+    if max_entries is None:
+        max_entries = get_global_config_value('cache.max_entries', 100000)
+    if max_age_days is None:
+        max_age_days = get_global_config_value('cache.max_age_days', 90)
+    from auto_i18n.cache import TranslationCache
+
+    translation_cache = TranslationCache()
+    removed = translation_cache.prune(max_entries, max_age_days)
+    translation_cache.close()
+    click.echo(click.style(I18N.cache.prune.success.format(count=removed), fg='green'))
+
+
+@cache.command('clear', help=I18N.cache.clear.help)
+def cache_clear():
+    """Remove all cache entries."""
+    from auto_i18n.cache import TranslationCache
+
+    translation_cache = TranslationCache()
+    removed = translation_cache.clear()
+    translation_cache.close()
+    click.echo(
+        click.style(I18N.cache.clear.success.format(count=removed), fg='green')
+    )
 
 
 @cli.command(help=I18N.export.help)
@@ -314,6 +434,8 @@ def export(format):
     else:
         export_dir = Path.cwd()
 
+    from auto_i18n.export import export_i18n
+
     export_i18n(format, export_dir)
 
 
@@ -1,5 +1,8 @@
+import copy
+import os
+import threading
 from pathlib import Path
-from typing import Any, Literal, Optional, TypedDict
+from typing import Any, Literal, Optional, TypedDict, Union
 
 from auto_i18n import io
 from auto_i18n.utils import deep_update, merge_objects
@@ -30,6 +33,43 @@ PROMPT_TRANSLATE = r"""
 ```
 """.strip()
 
+PROMPT_TRANSLATE_MULTI = r"""
+## Task Description
+
+- Task: Translate the content of the i18n file {InFile} (see [## i18n Content]) to several other languages, one for each of the target files {OutFiles}.
+- Requirements:
+  - The language of each target file is indicated by its file name
+  - Output format: a JSON object, whose top-level keys are exactly the target file names, and each value is the translated i18n JSON of that file, retaining the structure and keys of the input
+  - Output the JSON code directly, without attaching the ```json``` code block identifier
+
+## Vocabulary
+
+{Dict}
+
+## i18n Content
+
+```json
+{I18n}
+```
+
+## An example, for reference only!
+
+Target files: ["en_US.json", "ja_JP.json"]
+
+Input:
+
+```json
+{"greeting": "你好"}
+```
+
+Output
+
+{
+"en_US.json": {"greeting": "Hello"},
+"ja_JP.json": {"greeting": "こんにちは"}
+}
+""".strip()
+
 PROMPT_AUTOKEY = r"""
 ## Task Description
 
@@ -69,6 +109,54 @@ Output
 }
 """.strip()
 
+PROMPT_AUTOKEY_BATCH = r"""
+## Task Description
+
+- Background: You are developing a project which need to using i18n variables for internationalization.
+- Task:
+  1. Read all the [## i18n text], it is a JSON object, each property is a group of texts that belong to the same module
+  2. Generate appropriate key names based on the content of each text
+  3. Summarize the results into a JSON, keeping the group names of the input as the top-level keys
+- **Output Format Requirements**:
+  - Retaining JSON format
+  - Output the JSON code directly, without attaching the ```json``` code block identifier
+  - Every text of the input must appear exactly once in the output, under its own group
+- **Key Name Requirements**:
+  - **Only lowercase English letters and numbers are allowed**, no other special symbols (such as spaces, -, underscores, etc.)
+    - E.g. "greeting" and "invalidinputnumber" are valid, while "welcome_here", "invalid-input-number", and "非英文字符" are not valid
+  - **Keep short and concise**, each key name within 15 characters, upmost to 25 characters, it is ok to scacrifice readability for brevity.
+  - Key names must be unique within a group
+
+## i18n Text
+
+```json
+{groups}
+```
+
+## An example, for reference only!
+
+Input:
+
+```json
+{
+  "home_ts": ["Hello {0}", "Warning! Please do not enter numbers outside 0-10!"],
+  "setting_svelte": ["Save"]
+}
+```
+
+Output
+
+{
+"home_ts": {
+  "greeting": "Hello {0}",
+  "invalidinputnumber": "Warning! Please do not enter numbers outside 0-10!"
+},
+"setting_svelte": {
+  "save": "Save"
+}
+}
+""".strip()
+
 PROMPT_TRANSLATE_TEXT = r"""
 **Task**:
 Translate the following content after `------` into the specified language: `{Lang}`.
@@ -88,13 +176,28 @@ DEFAULT_GLOBAL_CONFIG = {
         'endpoint': 'https://api.openai.com/v1/chat/completions',
         'key': '',
         'model': 'gpt-4o',
+        'pool_size': 16,
+        'connect_timeout': 10,
+        'timeout': 300,
+        'max_retries': 5,
+        'rpm': 0,
+        'tpm': 0,
+        'stream': False,
+        'idle_timeout': 60,
     },
     'lang': 'en_US',
     'prompt': {
         'translate': PROMPT_TRANSLATE,
+        'translateMulti': PROMPT_TRANSLATE_MULTI,
         'autokey': PROMPT_AUTOKEY,
+        'autokeyBatch': PROMPT_AUTOKEY_BATCH,
         'translateText': PROMPT_TRANSLATE_TEXT,
     },
+    'cache': {
+        'enabled': True,
+        'max_entries': 100000,
+        'max_age_days': 90,
+    },
 }
 
 DEFAULT_PROJECT_CONFIG = {
@@ -107,22 +210,46 @@ DEFAULT_PROJECT_CONFIG = {
     'i18n_var_prefix': 'i18n',
     'export_dir': None,
     'i18n_var_mid': 'filename',
+    'concurrency': 4,
+    'batch_size': 6000,
+    'max_retries': 2,
+    'extract_batch': False,
+    'scan_workers': 0,
+    'multi_target': False,
+    'multi_target_max': 8,
 }
 
 class GPT(TypedDict):
     endpoint: str
     key: str
     model: str
+    pool_size: int
+    connect_timeout: Optional[float]
+    timeout: Optional[float]
+    max_retries: int
+    rpm: Optional[float]
+    tpm: Optional[float]
+    stream: bool
+    idle_timeout: Optional[float]
 
 
 class Prompt(TypedDict):
     translate: str
+    translateMulti: str
     autokey: str
+    autokeyBatch: str
+
+
+class Cache(TypedDict):
+    enabled: bool
+    max_entries: int
+    max_age_days: float
 
 
 class GlobalConfig(TypedDict):
     GPT: GPT
     prompt: Prompt
+    cache: Cache
     lang: Literal['en_US', 'zh_CN']
 
 
@@ -130,17 +257,60 @@ class ProjectConfig(TypedDict):
     i18n_dir: str
     main_file: str
     code_files: list[str]
-    i18n_pattern: str
+    i18n_pattern: Union[str, list[str], dict[str, Union[str, list[str]]]]
     dict: dict[str, str]
     strategy: str
     i18n_var_prefix: str
     global_config: Optional[GlobalConfig]
     export_dir: Optional[str]  # Add this line
     i18n_var_mid: Literal['filename', 'filename_noext', 'pathname']
+    concurrency: int
+    batch_size: int
+    max_retries: int
+    extract_batch: bool
+    scan_workers: int
+    multi_target: bool
+    multi_target_max: int
+
+
+# 配置文件的解析结果缓存: 绝对路径 -> (mtime, 解析结果)
+_config_cache: dict[str, tuple[Optional[int], Any]] = {}
+_config_cache_lock = threading.Lock()
+
+
+def read_config_file(file_path: io.FilePath):
+    """读取 YAML 配置文件
+
+    同一进程内每个文件只解析一次, 文件的 mtime 变化后重新解析;
+    返回的是缓存的副本, 调用方可以随意修改
+    """
+    path = os.path.abspath(file_path)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except OSError:
+        mtime = None
+
+    with _config_cache_lock:
+        cached = _config_cache.get(path)
+        if cached is None or cached[0] != mtime:
+            data = io.read_yaml(path) if mtime is not None else {}
+            cached = (mtime, data)
+            _config_cache[path] = cached
+    return copy.deepcopy(cached[1])
+
+
+def clear_config_cache():
+    with _config_cache_lock:
+        _config_cache.clear()
+
+
+def write_config_file(file_path: io.FilePath, data: dict):
+    io.write_yaml(file_path, data)
+    clear_config_cache()
 
 
 def get_global_config(merge_project: bool = True) -> GlobalConfig:
-    global_config = io.read_yaml(CONFIG_FILE)
+    global_config = read_config_file(CONFIG_FILE)
     project_config = get_project_config()
 
     if merge_project and 'global_config' in project_config and project_config['global_config']:
@@ -150,7 +320,7 @@ def get_global_config(merge_project: bool = True) -> GlobalConfig:
 
 
 def get_project_config() -> ProjectConfig:
-    return io.read_yaml(Path(PROJECT_CONFIG_FILE))
+    return read_config_file(PROJECT_CONFIG_FILE)
 
 
 # Add new migration function
@@ -162,7 +332,7 @@ def migrate_from_old_config():
 
         # Read old config and write to new location
         old_config = io.read_yaml(OLD_CONFIG_FILE)
-        io.write_yaml(CONFIG_FILE, old_config)
+        write_config_file(CONFIG_FILE, old_config)
 
         # Remove old config file
         OLD_CONFIG_FILE.unlink()
@@ -176,12 +346,12 @@ def init_global_config():
         default_config: GlobalConfig = DEFAULT_GLOBAL_CONFIG
         # Ensure directory exists
         CONFIG_FILE.parent.mkdir(parents=True, exist_ok=True)
-        io.write_yaml(CONFIG_FILE, default_config)
+        write_config_file(CONFIG_FILE, default_config)
     else:
         global_config = get_global_config(False)
         # use exists global_config to overwrite the default config
         updated_config = merge_objects(DEFAULT_GLOBAL_CONFIG, global_config)
-        io.write_yaml(CONFIG_FILE, updated_config)
+        write_config_file(CONFIG_FILE, updated_config)
 
 
 def init_project_config(overwrite: bool = False):
@@ -209,6 +379,7 @@ def init_project_config(overwrite: bool = False):
     comments = [f'# {comment}\n' for comment in comments]
     with open(PROJECT_CONFIG_FILE, 'w', encoding='utf-8') as file:
         file.writelines(comments + lines)
+    clear_config_cache()
 
     return True
 
@@ -243,7 +414,7 @@ def set_config_value(key: str, value: Any, global_config=True):
             current[k] = {}
         current = current[k]
     current[keys[-1]] = value
-    io.write_yaml(CONFIG_FILE if global_config else PROJECT_CONFIG_FILE, config)
+    write_config_file(CONFIG_FILE if global_config else PROJECT_CONFIG_FILE, config)
 
 
 def list_config(global_config=True):
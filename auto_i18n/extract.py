@@ -1,15 +1,36 @@
 import json
-import re
+from collections import ChainMap
 from pathlib import Path
-from typing import Union
+from typing import Optional, Union
 
 import click
 
-from auto_i18n.config import get_global_config_value, get_project_config_value
-from auto_i18n.gpt import send_gpt_request
+from auto_i18n.config import (
+    DEFAULT_GLOBAL_CONFIG,
+    get_global_config_value,
+    get_project_config_value,
+)
+from auto_i18n.gpt import request_json
 from auto_i18n.i18n import i18n
 from auto_i18n.io import read_file, read_i18n_file, write_file, write_i18n_file
-from auto_i18n.utils import echo, ensure_no_md_code_block, merge_objects, regex_findall
+from auto_i18n.journal import RunJournal, finish_journal, start_journal
+from auto_i18n.manifest import ScanManifest, hash_content
+from auto_i18n.plan import PLAN_FILE, ExtractPlan, Replacement, apply_replacements
+from auto_i18n.scanner import (
+    InvalidPatternError,
+    Scanner,
+    collect_files,
+    resolve_workers,
+    scan_files,
+)
+from auto_i18n.utils import (
+    PROFILER,
+    chunk_objects,
+    echo,
+    map_concurrently,
+    merge_objects,
+    profiled,
+)
 from auto_i18n.utils.string import replace_vars
 
 I18N = i18n()
@@ -39,109 +60,383 @@ def ensure_valid_key(
     return checked_obj
 
 
-def replace_i18n_in_code(code: str, i18n_dict: dict[str, str], pattern: str, prefix: str):
-    def replacer(match):
-        text = match.group(1)
-        for key, value in i18n_dict.items():
-            if value == text:
-                return f'{prefix}.{key}'
-        return match.group(0)
+def build_reverse_index(i18n_dict: dict, parent_key: str = '') -> dict[str, str]:
+    """建立 文本 -> key 的反向索引, 嵌套的 key 使用 . 连接
 
-    return re.sub(pattern, replacer, code)
+    多个 key 对应相同的文本时, 保留遍历顺序中的第一个 key
+    """
+    index = {}
+    for key, value in i18n_dict.items():
+        key_path = f'{parent_key}.{key}' if parent_key else key
+        if isinstance(value, dict):
+            for text, sub_key in build_reverse_index(value, key_path).items():
+                index.setdefault(text, sub_key)
+        elif isinstance(value, str):
+            index.setdefault(value, key_path)
+    return index
+
+
+def find_replacements(
+    code: str, scanner: Scanner, code_file: Path, index: dict[str, str]
+) -> list[Replacement]:
+    """找出代码中匹配 i18n_pattern 并且在 index 中有对应 key 的文本的位置"""
+    replacements = []
+    for start, end, text in scanner.spans(code, code_file):
+        key = index.get(text)
+        if key is not None:
+            replacements.append({'start': start, 'end': end, 'key': key, 'text': text})
+    return replacements
+
+
+def get_middle_key(code_file: Path, directory, i18n_var_mid: str) -> str:
+    if i18n_var_mid == 'filename':
+        return ensure_valid_key(code_file.name, convert_to_underscore=True)
+    elif i18n_var_mid == 'filename_noext':
+        return ensure_valid_key(code_file.stem, convert_to_underscore=True)
+    elif i18n_var_mid == 'pathname':
+        return ensure_valid_key(
+            str(code_file.relative_to(directory)).replace('/', '_').replace('\\', '_')
+        )
+    else:
+        return ensure_valid_key(code_file.name)  # Fallback to full filename
 
 
-def extract_i18n(directory='.'):
+def extract_i18n(
+    directory='.',
+    jobs=None,
+    batch=None,
+    force=False,
+    scan_workers=None,
+    plan_file=None,
+    resume=False,
+):
+    """提取代码中的 i18n 文本, 生成 key 并替换代码中的文本
+
+    指定 plan_file 时只生成提取计划 (见 ExtractPlan), 不修改代码文件和主 i18n 文件;
+    resume 为 True 时复用上一次中断的运行中已经完成的 GPT 请求 (见 RunJournal)
+    """
     code_files = get_project_config_value('code_files', ['*.ts', '*.svelte'])
     i18n_pattern = get_project_config_value('i18n_pattern', r'\(\((`$1`)\)\)')
     i18n_var_prefix = get_project_config_value('i18n_var_prefix', 'i18n')
     i18n_var_mid = get_project_config_value('i18n_var_mid', 'filename')
-
-    project_code_files: list[Path] = []
-    for pattern in code_files:
-        project_code_files.extend(Path(directory).glob(pattern))
+    max_retries = get_project_config_value('max_retries', 2)
+    if jobs is None:
+        jobs = get_project_config_value('concurrency', 1)
+    if batch is None:
+        batch = get_project_config_value('extract_batch', False)
+    if scan_workers is None:
+        scan_workers = get_project_config_value('scan_workers', 0)
+
+    with PROFILER.phase('extract.glob'):
+        # 多个 glob 匹配到同一个文件时只处理一次
+        project_code_files = collect_files(directory, code_files)
 
     if not project_code_files:
         return
 
-    new_i18ns = {}
-
-    for code_file in project_code_files:
-        click.echo(click.style(f'📝 {code_file}', fg='cyan'))
-        code = read_file(code_file)
-
-        lines = regex_findall(code, i18n_pattern)
-        if not lines:
-            click.echo(
-                replace_vars(
-                    I18N.extractpy.notfoundi18nvar, {'code_file': str(code_file)}
-                )
+    # 所有 pattern 只编译一次; 每个文件适用的 pattern 合并为一个正则表达式
+    try:
+        scanner = Scanner(i18n_pattern)
+    except InvalidPatternError as e:
+        echo.error(
+            replace_vars(
+                I18N.extractpy.invalidpattern, {'pattern': e.pattern, 'error': e.error}
             )
-            continue
-
-        prompt = get_global_config_value('prompt.autokey', '')
-        line_text = '\n'.join(lines) if len(lines) > 1 else lines[0]
-        prompt = prompt.replace(r'{lines}', line_text)
-
-        result = send_gpt_request(prompt)
-        result = ensure_no_md_code_block(result)
-        try:
-            new_i18n = json.loads(result)
-        except json.JSONDecodeError:
-            echo.error(replace_vars(I18N.extractpy.extractionfail, {'result': result}))
-            continue
-        new_i18n = ensure_valid_key(new_i18n, convert_to_underscore=True)
-
-        if i18n_var_mid == 'filename':
-            middle_key = ensure_valid_key(code_file.name, convert_to_underscore=True)
-        elif i18n_var_mid == 'filename_noext':
-            middle_key = ensure_valid_key(code_file.stem, convert_to_underscore=True)
-        elif i18n_var_mid == 'pathname':
-            middle_key = ensure_valid_key(
-                str(code_file.relative_to(directory)).replace('/', '_').replace('\\', '_')
+        )
+        return
+    manifest = ScanManifest(scanner.key)
+    if force:
+        manifest.entries = {}
+
+    main_i18n = read_i18n_file(get_main_i18n_file_path()) or {}
+    plan = None
+    if plan_file is not None:
+        plan = ExtractPlan(i18n_var_prefix, get_main_i18n_hash(), plan_file)
+    # 文本 -> 完整 key 路径的反向索引, 已经存在于主文件中的文本直接复用原来的 key;
+    # 优先使用同一命名空间 (中间 key) 下的 key, 其次是整个主文件中的 key
+    global_index = build_reverse_index(main_i18n)
+    namespace_indexes: dict[str, dict[str, str]] = {}
+
+    # 先顺序扫描所有文件, 然后并发请求 GPT, 最后按文件顺序替换、写入
+    with PROFILER.phase('extract.scan'):
+        candidates = []
+        skipped = 0
+        for code_file in project_code_files:
+            # 按扩展名配置 i18n_pattern 时, 没有适用 pattern 的文件不需要扫描
+            if scanner.pattern_for(code_file) is None:
+                continue
+
+            # mtime 和大小都没有变化的文件无需读取
+            if manifest.is_unchanged(code_file, code_file.stat()):
+                manifest.touch(code_file)
+                skipped += 1
+                continue
+
+            # 上次扫描时没有 i18n 标记的文件, 内容哈希相同时不需要重新匹配
+            entry = manifest.get(code_file)
+            known_hash = entry['hash'] if entry and not entry['markers'] else None
+            candidates.append((code_file, known_hash))
+
+        # 读取和匹配文件在进程池中进行, 主进程只处理包含 i18n 标记的文件
+        workers = resolve_workers(scan_workers, len(candidates))
+        tasks = []
+        for result in scan_files(scanner, candidates, workers):
+            code_file, lines = result.path, result.lines
+            click.echo(click.style(f'📝 {code_file}', fg='cyan'))
+            manifest.record(
+                code_file, result.mtime, result.size, result.hash, bool(lines)
             )
-        else:
-            middle_key = ensure_valid_key(code_file.name)  # Fallback to full filename
-
-        new_i18ns[middle_key] = new_i18n
-
-        for key, value in new_i18n.items():
-            echo.debug(f'\t{i18n_var_prefix}.{middle_key}.{key}: "{value}"')
-            if key in new_i18ns:
-                # echo.warning(f'\t🚨 ⚠️{key} 在 {code_fname} 下重复了!')
-                echo.warning(
+            if lines is None:
+                skipped += 1
+                continue
+            if not lines:
+                click.echo(
                     replace_vars(
-                        I18N.extractpy.duplicatekey,
-                        {'key': key, 'code_fname': middle_key},
+                        I18N.extractpy.notfoundi18nvar, {'code_file': str(code_file)}
                     )
                 )
-                suffix = 1
-                while f'{key}{suffix}' in new_i18ns:
-                    suffix += 1
+                continue
 
-                echo.warning(
+            middle_key = get_middle_key(code_file, directory, i18n_var_mid)
+            if middle_key not in namespace_indexes:
+                namespace = main_i18n.get(middle_key)
+                namespace_indexes[middle_key] = build_reverse_index(
+                    namespace if isinstance(namespace, dict) else {}, middle_key
+                )
+            index = ChainMap(namespace_indexes[middle_key], global_index)
+            new_lines = [line for line in dict.fromkeys(lines) if line not in index]
+            if len(new_lines) < len(set(lines)):
+                echo.debug(
                     replace_vars(
-                        I18N.extractpy.avoidconflict, {'0': key, '1': f'{key}{suffix}'}
+                        I18N.extractpy.reuseexistingkeys,
+                        {'count': len(set(lines)) - len(new_lines)},
                     )
                 )
-                key = f'{key}{suffix}'
+            tasks.append((code_file, result.code, new_lines, middle_key))
 
-        code = replace_i18n_in_code(
-            code, new_i18n, i18n_pattern, f'{i18n_var_prefix}.{middle_key}'
-        )
+    if skipped:
+        echo.debug(replace_vars(I18N.extractpy.skipunchanged, {'count': skipped}))
 
-        write_file(code_file, code)
+    # 所有请求都完成之后才开始修改代码文件, 中断时不会留下替换了一半的代码
+    journal = start_journal('extract', resume)
+    if batch:
+        results = generate_keys_batched(tasks, max_retries, jobs, journal)
+    else:
+        results = list(generate_keys(tasks, max_retries, jobs, journal))
+
+    new_i18ns = {}
 
-    if new_i18ns:
+    with PROFILER.phase('extract.apply'):
+        for (code_file, code, _, middle_key), (new_i18n, result) in zip(tasks, results):
+            if new_i18n is None:
+                echo.error(
+                    replace_vars(I18N.extractpy.extractionfail, {'result': result})
+                )
+                continue
+            new_i18n = ensure_valid_key(new_i18n, convert_to_underscore=True)
+
+            index = ChainMap(namespace_indexes[middle_key], global_index)
+            existing = main_i18n.get(middle_key)
+            existing = existing if isinstance(existing, dict) else {}
+            namespace_i18n = new_i18ns.setdefault(middle_key, {})
+
+            for key, value in new_i18n.items():
+                if value in index:
+                    # 之前处理的其他文件已经为该文本生成了 key
+                    continue
+                taken = existing.keys() | namespace_i18n.keys()
+                if key in taken:
+                    # echo.warning(f'\t🚨 ⚠️{key} 在 {code_fname} 下重复了!')
+                    echo.warning(
+                        replace_vars(
+                            I18N.extractpy.duplicatekey,
+                            {'key': key, 'code_fname': middle_key},
+                        )
+                    )
+                    suffix = 1
+                    while f'{key}{suffix}' in taken:
+                        suffix += 1
+
+                    echo.warning(
+                        replace_vars(
+                            I18N.extractpy.avoidconflict,
+                            {'0': key, '1': f'{key}{suffix}'},
+                        )
+                    )
+                    key = f'{key}{suffix}'
+                echo.debug(f'\t{i18n_var_prefix}.{middle_key}.{key}: "{value}"')
+                namespace_i18n[key] = value
+                namespace_indexes[middle_key][value] = f'{middle_key}.{key}'
+                global_index.setdefault(value, f'{middle_key}.{key}')
+
+            replacements = find_replacements(code, scanner, code_file, index)
+            if plan is not None:
+                plan.add_file(code_file, code, replacements)
+                continue
+            code = apply_replacements(code, replacements, i18n_var_prefix)
+
+            write_file(code_file, code)
+            remaining = scanner.findall(code, code_file)
+            manifest.update(code_file, code, markers=bool(remaining))
+
+    manifest.save()
+
+    new_i18ns = {key: value for key, value in new_i18ns.items() if value}
+    if plan is not None:
+        plan.i18n = new_i18ns
+        plan.save()
+        echo.info(
+            replace_vars(
+                I18N.extractpy.plansaved,
+                {'files': len(plan.files), 'path': str(plan.path)},
+            )
+        )
+    elif new_i18ns:
         update_main_i18n_file(new_i18ns)
     else:
         echo.warning(I18N.extractpy.noupdatei18nfile)
+    finish_journal(journal)
 
 
-def update_main_i18n_file(new_i18ns):
+def apply_extract_plan(plan_file=PLAN_FILE):
+    """根据 extract --plan 生成的计划替换代码并更新主 i18n 文件, 不请求 GPT
+
+    先检查所有文件, 全部准备好之后才开始写入; 生成计划之后被修改过的文件会被跳过,
+    已经应用过计划的文件不会重复替换, 因此可以重复执行
+    """
+    plan = ExtractPlan.load(plan_file)
+    if plan is None:
+        echo.error(replace_vars(I18N.extractpy.plannotfound, {'path': plan_file}))
+        return
+    if plan.main_hash != get_main_i18n_hash():
+        echo.warning(I18N.extractpy.planmainchanged)
+
+    with PROFILER.phase('extract.apply'):
+        updates = []
+        applied = 0
+        for name in plan.files:
+            code_file = Path(name)
+            code = read_file(code_file) if code_file.is_file() else None
+            if code is not None and plan.is_applied(code_file, code):
+                applied += 1
+                continue
+            new_code = plan.apply(code_file, code) if code is not None else None
+            if new_code is None:
+                echo.warning(
+                    replace_vars(I18N.extractpy.planstale, {'code_file': name})
+                )
+                continue
+            updates.append((code_file, new_code))
+
+        for code_file, code in updates:
+            write_file(code_file, code)
+
+    if plan.i18n and (updates or applied):
+        update_main_i18n_file(plan.i18n)
+    echo.info(
+        replace_vars(
+            I18N.extractpy.planapplied,
+            {'count': len(updates), 'applied': applied},
+        )
+    )
+
+
+def generate_keys(
+    tasks, max_retries: int, jobs: int, journal: Optional[RunJournal] = None
+):
+    """每个代码文件单独发送一次 autokey 请求, 按 tasks 的顺序返回 (key 字典, 原始回复)"""
+    request = journal.request_json if journal is not None else request_json
+    prompt = get_global_config_value('prompt.autokey', '')
+
+    @profiled('extract.prompt')
+    def build_prompt(lines: list[str]) -> str:
+        line_text = '\n'.join(lines) if len(lines) > 1 else lines[0]
+        return prompt.replace(r'{lines}', line_text)
+
+    def send(task):
+        lines = task[2]
+        if not lines:
+            return {}, ''
+        return request(build_prompt(lines), max_retries)
+
+    return map_concurrently(send, tasks, jobs)
+
+
+def generate_keys_batched(
+    tasks, max_retries: int, jobs: int, journal: Optional[RunJournal] = None
+):
+    """将多个代码文件的文本按中间 key 分组, 打包到同一个 autokey 请求中
+
+    每个请求的大小不超过项目配置中的 batch_size; 回复会被拆分回各个文件,
+    按 tasks 的顺序返回 (key 字典, 原始回复)
+    """
+    prompt = get_global_config_value(
+        'prompt.autokeyBatch', DEFAULT_GLOBAL_CONFIG['prompt']['autokeyBatch']
+    )
+    batch_size = get_project_config_value('batch_size', 6000)
+    request = journal.request_json if journal is not None else request_json
+
+    groups: dict[str, list[str]] = {}
+    for _, _, lines, middle_key in tasks:
+        if not lines:
+            continue
+        group = groups.setdefault(middle_key, [])
+        group.extend(line for line in dict.fromkeys(lines) if line not in group)
+
+    batches = chunk_objects(groups, batch_size)
+    echo.debug(
+        replace_vars(
+            I18N.extractpy.batchrequests,
+            {'files': len(tasks), 'count': len(batches)},
+        )
+    )
+
+    @profiled('extract.prompt')
+    def build_prompt(batch: dict[str, list[str]]) -> str:
+        return prompt.replace(
+            r'{groups}', json.dumps(batch, ensure_ascii=False, indent=2)
+        )
+
+    def send(batch: dict[str, list[str]]):
+        return request(build_prompt(batch), max_retries)
+
+    group_results = {}
+    for batch, (result, raw) in zip(batches, map_concurrently(send, batches, jobs)):
+        for middle_key in batch:
+            group_i18n = result.get(middle_key) if isinstance(result, dict) else None
+            if not isinstance(group_i18n, dict):
+                group_i18n = None
+            group_results[middle_key] = (group_i18n, raw)
+
+    results = []
+    for _, _, lines, middle_key in tasks:
+        if not lines:
+            results.append(({}, ''))
+            continue
+        group_i18n, raw = group_results[middle_key]
+        if group_i18n is None:
+            results.append((None, raw))
+            continue
+        file_i18n = {key: value for key, value in group_i18n.items() if value in lines}
+        results.append((file_i18n, raw))
+    return results
+
+
+def get_main_i18n_file_path() -> Path:
     i18n_dir = Path(get_project_config_value('i18n_dir', 'src/i18n'))
     main_file = get_project_config_value('main_file', 'zh_CN.yaml')
+    return i18n_dir / main_file
 
-    main_file_path = i18n_dir / main_file
+
+def get_main_i18n_hash() -> Optional[str]:
+    main_file_path = get_main_i18n_file_path()
+    if not main_file_path.is_file():
+        return None
+    return hash_content(read_file(main_file_path))
+
+
+def update_main_i18n_file(new_i18ns):
+    main_file_path = get_main_i18n_file_path()
     main_i18n = read_i18n_file(main_file_path)
 
     if not main_i18n:
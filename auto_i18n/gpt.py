@@ -1,45 +1,478 @@
+import asyncio
+import json
+import random
 import sys
+import threading
+import time
+from email.utils import parsedate_to_datetime
+from typing import Callable, Iterable, Iterator, Optional
 
 import click
 import requests
+from requests.adapters import HTTPAdapter
 
 from auto_i18n.config import get_global_config
 from auto_i18n.i18n import i18n
-from auto_i18n.utils import echo
+from auto_i18n.utils import (
+    PROFILER,
+    RateLimiter,
+    echo,
+    ensure_no_md_code_block,
+    estimate_tokens,
+    replace_vars,
+)
 
 I18N = i18n()
 
 
-def send_gpt_request(prompt: str):
-    config = get_global_config()
-    endpoint = config['GPT']['endpoint']
-    api_key = config['GPT']['key']
-    model = config['GPT']['model']
+DEFAULT_POOL_SIZE = 16
+DEFAULT_CONNECT_TIMEOUT = 10
+DEFAULT_READ_TIMEOUT = 300
+DEFAULT_MAX_RETRIES = 5
+DEFAULT_IDLE_TIMEOUT = 60
 
-    headers = {'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'}
+# 流式输出时刷新进度的最小间隔 (秒)
+PROGRESS_INTERVAL = 0.1
 
-    data = {
-        'model': model,
-        'messages': [{'role': 'user', 'content': prompt}],
-        'temperature': 0.6,
-    }
+# 流式输出的回调: on_delta 收到每一段新生成的文本, on_restart 在重试之前调用,
+# 表示之前收到的内容作废
+DeltaCallback = Callable[[str], None]
+RestartCallback = Callable[[], None]
 
-    TIMEOUT_SECONDS = None
+# 遇到这些状态码时重试
+RETRY_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
 
-    echo.debug(I18N.gpt_py.sendingrequesttogpt + f' | [{model}] -> {endpoint}')
 
+class GPTRequestError(Exception):
+    """GPT 请求失败: 不可重试的错误, 或者重试次数用完之后仍然失败"""
+
+    def __init__(
+        self, message: str, response_text: Optional[str] = None, invalid: bool = False
+    ):
+        super().__init__(message)
+        self.response_text = response_text
+        self.invalid = invalid
+
+
+class RetryableError(Exception):
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After 响应头, 支持秒数和 HTTP 日期两种格式"""
+    if not value:
+        return None
     try:
-        response = requests.post(
-            endpoint, headers=headers, json=data, timeout=TIMEOUT_SECONDS
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+def iter_sse_events(lines: Iterable[str]) -> Iterator[str]:
+    """解析 server-sent events 流, 依次返回每个事件的 data 字段
+
+    多行 data 使用换行连接; 空行表示一个事件结束, 以 : 开头的行是注释
+    """
+    data = []
+    for line in lines:
+        if not line:
+            if data:
+                yield '\n'.join(data)
+                data = []
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        if field == 'data':
+            data.append(value[1:] if value.startswith(' ') else value)
+    if data:
+        yield '\n'.join(data)
+
+
+def backoff_delay(attempt: int, retry_after: Optional[float] = None) -> float:
+    """第 attempt 次重试前等待的秒数
+
+    优先使用服务端返回的 Retry-After, 否则为带随机抖动的指数退避
+    """
+    if retry_after is not None:
+        return retry_after + random.uniform(0, BACKOFF_BASE_SECONDS)
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * 2**attempt)
+    return random.uniform(delay / 2, delay)
+
+
+class GPTClient:
+    """Chat completion 客户端
+
+    持有一个带连接池的 requests.Session, 多次请求 (包括多线程并发请求) 复用同一组
+    keep-alive 连接; endpoint、key、model 等配置只在创建时解析一次。
+    所有请求共享同一个 RateLimiter, 429 和服务端错误会按照 Retry-After 或指数退避重试。
+
+    stream 为 True 时使用 server-sent events 逐段接收回复, 并实时显示进度:
+    超过 idle_timeout 秒没有收到任何数据, 或者整个回复超过 read_timeout 秒时重试
+    """
+
+    def __init__(
+        self,
+        endpoint: str,
+        key: str,
+        model: str,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        connect_timeout: Optional[float] = DEFAULT_CONNECT_TIMEOUT,
+        read_timeout: Optional[float] = DEFAULT_READ_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        rpm: Optional[float] = None,
+        tpm: Optional[float] = None,
+        stream: bool = False,
+        idle_timeout: Optional[float] = DEFAULT_IDLE_TIMEOUT,
+    ):
+        self.endpoint = endpoint
+        self.model = model
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.limiter = RateLimiter(rpm, tpm)
+        self.stream = stream
+        self.idle_timeout = idle_timeout
+
+        # 所有正在进行的流式请求已经接收的字符数, 用于显示进度
+        self._progress_lock = threading.Lock()
+        self._received = 0
+        self._streaming = 0
+        self._reported_at = 0.0
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.session.headers.update(
+            {
+                'Authorization': f'Bearer {key}',
+                'Content-Type': 'application/json',
+                'Connection': 'keep-alive',
+            }
         )
-        response.raise_for_status()
-    except Exception as e:
-        click.echo(click.style(I18N.errors.connection_failed.format(error=str(e)), fg='red'))
-        sys.exit(1)
 
-    try:
-        return response.json()['choices'][0]['message']['content']
-    except Exception as e:
+    @classmethod
+    def from_config(cls) -> 'GPTClient':
+        gpt = get_global_config()['GPT']
+        return cls(
+            gpt['endpoint'],
+            gpt['key'],
+            gpt['model'],
+            pool_size=gpt.get('pool_size', DEFAULT_POOL_SIZE),
+            connect_timeout=gpt.get('connect_timeout', DEFAULT_CONNECT_TIMEOUT),
+            read_timeout=gpt.get('timeout', DEFAULT_READ_TIMEOUT),
+            max_retries=gpt.get('max_retries', DEFAULT_MAX_RETRIES),
+            rpm=gpt.get('rpm'),
+            tpm=gpt.get('tpm'),
+            stream=gpt.get('stream', False),
+            idle_timeout=gpt.get('idle_timeout', DEFAULT_IDLE_TIMEOUT),
+        )
+
+    def build_request(self, prompt: str, stream: bool = False) -> dict:
+        data = {
+            'model': self.model,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'temperature': 0.6,
+        }
+        if stream:
+            data['stream'] = True
+        return data
+
+    def post(
+        self,
+        data: dict,
+        reserved_tokens: int = 0,
+        on_delta: Optional[DeltaCallback] = None,
+    ) -> str:
+        """发送一次请求, 不做任何重试; 可以重试的错误抛出 RetryableError"""
+        PROFILER.count('gpt.requests')
+        with PROFILER.phase('gpt.request'):
+            content, usage = self.request(data, on_delta)
+
+        if reserved_tokens and usage.get('total_tokens'):
+            self.limiter.adjust_tokens(usage['total_tokens'] - reserved_tokens)
+
+        PROFILER.count('gpt.prompt_chars', len(data['messages'][-1]['content']))
+        PROFILER.count('gpt.response_chars', len(content))
+        for key in ('prompt_tokens', 'completion_tokens', 'total_tokens'):
+            PROFILER.count(f'gpt.{key}', usage.get(key) or 0)
+        return content
+
+    def request(
+        self, data: dict, on_delta: Optional[DeltaCallback] = None
+    ) -> tuple[str, dict]:
+        """post 的实现, 返回 (回复内容, usage)"""
+        echo.debug(
+            I18N.gpt_py.sendingrequesttogpt + f' | [{self.model}] -> {self.endpoint}'
+        )
+
+        stream = data.get('stream', False)
+        # 流式请求的读取超时即为空闲超时: 两次收到数据之间的最长间隔
+        timeout = (self.timeout[0], self.idle_timeout) if stream else self.timeout
+        try:
+            response = self.session.post(
+                self.endpoint, json=data, timeout=timeout, stream=stream
+            )
+        except (requests.ConnectionError, requests.Timeout) as e:
+            raise RetryableError(str(e)) from e
+        except requests.RequestException as e:
+            raise GPTRequestError(str(e)) from e
+
+        if response.status_code in RETRY_STATUS_CODES:
+            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+            if response.status_code == 429:
+                self.limiter.pause(backoff_delay(0, retry_after))
+            raise RetryableError(
+                f'{response.status_code} {response.reason}', retry_after
+            )
+
+        try:
+            response.raise_for_status()
+        except requests.HTTPError as e:
+            raise GPTRequestError(str(e), response.text) from e
+
+        if stream:
+            return self.read_stream(response, on_delta)
+
+        try:
+            body = response.json()
+            content = body['choices'][0]['message']['content']
+        except Exception as e:
+            raise GPTRequestError(str(e), response.text, invalid=True) from e
+
+        return content, body.get('usage') or {}
+
+    def read_stream(
+        self, response: requests.Response, on_delta: Optional[DeltaCallback] = None
+    ) -> tuple[str, dict]:
+        """读取流式回复, 返回 (完整内容, usage)"""
+        deadline = (
+            time.monotonic() + self.timeout[1] if self.timeout[1] is not None else None
+        )
+
+        def timed(lines: Iterable[str]) -> Iterator[str]:
+            # 每一行 (包括 : 开头的 keep-alive 注释) 都检查总时长, 只发送注释的流也会超时
+            for line in lines:
+                if deadline is not None and time.monotonic() > deadline:
+                    raise RetryableError(
+                        replace_vars(
+                            I18N.gpt_py.streamtimeout, {'timeout': self.timeout[1]}
+                        )
+                    )
+                yield line
+
+        parts = []
+        usage = {}
+        self._stream_started()
+        try:
+            # SSE 总是 UTF-8 编码; Content-Type 没有 charset 时 requests 会按 ISO-8859-1 解码
+            response.encoding = 'utf-8'
+            # 分块传输时按照收到的分块读取; 否则逐字节读取, 不等待凑满缓冲区,
+            # 以便及时处理每一行 (默认每次读取 512 字节, 会一直等待后续数据)
+            chunk_size = None if response.raw.chunked else 1
+            lines = response.iter_lines(chunk_size, decode_unicode=True)
+            for event in iter_sse_events(timed(lines)):
+                if event.strip() == '[DONE]':
+                    break
+                try:
+                    chunk = json.loads(event)
+                except json.JSONDecodeError as e:
+                    raise GPTRequestError(str(e), event, invalid=True) from e
+                usage = chunk.get('usage') or usage
+                for choice in chunk.get('choices') or []:
+                    delta = (choice.get('delta') or {}).get('content')
+                    if not delta:
+                        continue
+                    parts.append(delta)
+                    self._stream_progress(len(delta))
+                    if on_delta is not None:
+                        on_delta(delta)
+        except requests.RequestException as e:
+            # 包括空闲超时以及连接中途断开
+            raise RetryableError(str(e)) from e
+        finally:
+            response.close()
+            self._stream_finished()
+        return ''.join(parts), usage
+
+    def _stream_started(self):
+        with self._progress_lock:
+            self._streaming += 1
+
+    def _stream_progress(self, size: int):
+        with self._progress_lock:
+            self._received += size
+            now = time.monotonic()
+            if now - self._reported_at < PROGRESS_INTERVAL:
+                return
+            self._reported_at = now
+            echo.status(
+                replace_vars(
+                    I18N.gpt_py.streamprogress,
+                    {'count': self._streaming, 'size': self._received},
+                )
+            )
+
+    def _stream_finished(self):
+        with self._progress_lock:
+            self._streaming -= 1
+            if self._streaming == 0:
+                self._received = 0
+                echo.clear_status()
+
+    def retry_delay(self, attempt: int, error: RetryableError) -> float:
+        if attempt >= self.max_retries:
+            raise GPTRequestError(str(error)) from error
+        PROFILER.count('gpt.retries')
+        delay = backoff_delay(attempt, error.retry_after)
+        echo.warning(
+            replace_vars(
+                I18N.gpt_py.retryrequest,
+                {
+                    'error': str(error),
+                    'delay': f'{delay:.1f}',
+                    'attempt': attempt + 1,
+                    'retries': self.max_retries,
+                },
+            )
+        )
+        return delay
+
+    def send(
+        self,
+        prompt: str,
+        on_delta: Optional[DeltaCallback] = None,
+        on_restart: Optional[RestartCallback] = None,
+    ) -> str:
+        """发送 prompt 并返回完整的回复
+
+        流式模式下每收到一段文本就调用 on_delta; 请求中途失败需要重试时,
+        先调用 on_restart 通知调用方丢弃已经收到的内容
+        """
+        data = self.build_request(prompt, self.stream)
+        # 预估 token 用量: prompt 本身加上同等长度的回复
+        tokens = estimate_tokens(prompt) * 2
+        attempt = 0
+        while True:
+            self.limiter.acquire(tokens)
+            try:
+                return self.post(data, tokens, on_delta)
+            except RetryableError as e:
+                time.sleep(self.retry_delay(attempt, e))
+                attempt += 1
+                if on_restart is not None:
+                    on_restart()
+
+    async def send_async(
+        self,
+        prompt: str,
+        on_delta: Optional[DeltaCallback] = None,
+        on_restart: Optional[RestartCallback] = None,
+    ) -> str:
+        """send 的 asyncio 版本; HTTP 请求在线程中执行, 等待限流和退避时不阻塞事件循环
+
+        流式模式下 on_delta 在执行请求的线程中调用
+        """
+        data = self.build_request(prompt, self.stream)
+        tokens = estimate_tokens(prompt) * 2
+        attempt = 0
+        while True:
+            await self.limiter.acquire_async(tokens)
+            try:
+                return await asyncio.to_thread(self.post, data, tokens, on_delta)
+            except RetryableError as e:
+                await asyncio.sleep(self.retry_delay(attempt, e))
+                attempt += 1
+                if on_restart is not None:
+                    on_restart()
+
+    def close(self):
+        self.session.close()
+
+
+_client: Optional[GPTClient] = None
+_client_lock = threading.Lock()
+
+
+def get_client() -> GPTClient:
+    """返回进程内共享的 GPTClient, 首次调用时根据全局配置创建"""
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = GPTClient.from_config()
+    return _client
+
+
+def exit_on_error(error: GPTRequestError):
+    if error.invalid:
         click.echo(click.style(I18N.errors.invalid_response, fg='red'))
-        click.echo(f'Response Text: {response.text}')
-        sys.exit(1)
+        click.echo(f'Response Text: {error.response_text}')
+    else:
+        click.echo(
+            click.style(I18N.errors.connection_failed.format(error=str(error)), fg='red')
+        )
+    sys.exit(1)
+
+
+def send_gpt_request(
+    prompt: str,
+    on_delta: Optional[DeltaCallback] = None,
+    on_restart: Optional[RestartCallback] = None,
+):
+    """发送 prompt 并返回回复; on_delta / on_restart 仅在开启 GPT.stream 时调用"""
+    try:
+        return get_client().send(prompt, on_delta, on_restart)
+    except GPTRequestError as e:
+        exit_on_error(e)
+
+
+async def send_gpt_request_async(
+    prompt: str,
+    on_delta: Optional[DeltaCallback] = None,
+    on_restart: Optional[RestartCallback] = None,
+) -> str:
+    """send_gpt_request 的 asyncio 版本
+
+    与 send_gpt_request 不同, 请求最终失败时抛出 GPTRequestError, 而不是退出程序
+    """
+    return await get_client().send_async(prompt, on_delta, on_restart)
+
+
+def is_streaming() -> bool:
+    """是否开启了流式输出 (GPT.stream)"""
+    return get_client().stream
+
+
+def request_json(prompt: str, retries: int = 0):
+    """发送 prompt 并将回复解析为 JSON
+
+    回复不是合法 JSON 时重试, 最多重试 retries 次; 返回 (解析结果, 最后一次的原始回复),
+    全部失败时解析结果为 None
+    """
+    result = ''
+    for attempt in range(retries + 1):
+        if attempt > 0:
+            echo.warning(
+                replace_vars(
+                    I18N.gpt_py.retryinvalidjson,
+                    {'attempt': attempt, 'retries': retries},
+                )
+            )
+        result = ensure_no_md_code_block(send_gpt_request(prompt))
+        try:
+            with PROFILER.phase('gpt.parse_json'):
+                return json.loads(result), result
+        except json.JSONDecodeError:
+            PROFILER.count('gpt.invalid_json')
+            continue
+    return None, result
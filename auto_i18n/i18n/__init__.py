@@ -1,28 +1,109 @@
+import hashlib
+import json
 import os
+from functools import lru_cache
 from pathlib import Path
-
-import yaml
+from typing import Optional
 
 from auto_i18n.config import get_global_config_value
 
 CUR_DIR = Path(os.path.dirname(os.path.abspath(__file__)))
 
+LANGUAGES = ['en_US', 'zh_CN']
+
+
+FALLBACK_LANGUAGE = 'en_US'
+
+
+class Catalog:
+    """不可变的界面文本树
+
+    支持 I18N.a.b 和 I18N.a['b'] 两种访问方式; 子节点在创建时一次性构建好,
+    访问时不会产生新的对象
+    """
+
+    __slots__ = ('_items',)
+
+    def __init__(self, data: dict, fallback: Optional[dict] = None):
+        """data 中缺失的 key 使用 fallback 中对应的文本"""
+        fallback = fallback or {}
+        items = {}
+        for key in {**fallback, **data}:
+            value = data.get(key, fallback.get(key))
+            if isinstance(value, dict):
+                fallback_value = fallback.get(key)
+                value = Catalog(
+                    value, fallback_value if isinstance(fallback_value, dict) else None
+                )
+            items[key] = value
+        object.__setattr__(self, '_items', items)
 
-class DottedDict(dict):
     def __getattr__(self, key: str):
-        value = self[key]
-        if isinstance(value, dict):
-            return DottedDict(value)
-        return value
+        try:
+            return self._items[key]
+        except KeyError:
+            raise AttributeError(key) from None
 
     def __getitem__(self, key: str):
-        value = super().__getitem__(key)
-        if isinstance(value, dict):
-            return DottedDict(value)
-        return value
+        return self._items[key]
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._items
+
+    def __iter__(self):
+        return iter(self._items)
+
+    def __setattr__(self, key: str, value):
+        raise AttributeError(f'{type(self).__name__} is immutable')
+
+    def __repr__(self) -> str:
+        return f'{type(self).__name__}({list(self._items)})'
+
+
+def snapshot_file(lang: str) -> Path:
+    return CUR_DIR / f'{lang}.snapshot.json'
+
+
+def build_snapshot(lang: str):
+    """将 {lang}.yaml 预编译为 JSON 快照, 修改 yaml 文件之后需要重新生成
+
+    python -m auto_i18n.i18n
+    """
+    import yaml
+
+    source = (CUR_DIR / f'{lang}.yaml').read_bytes()
+    snapshot = {
+        'source_hash': hashlib.sha1(source).hexdigest(),
+        'data': yaml.safe_load(source.decode('utf-8')),
+    }
+    with open(snapshot_file(lang), 'w', encoding='utf-8') as f:
+        json.dump(snapshot, f, ensure_ascii=False, separators=(',', ':'))
+
+
+@lru_cache(maxsize=None)
+def load_catalog(lang: str) -> dict:
+    """读取界面文本; 优先使用和 yaml 文件内容一致的 JSON 快照, 否则解析 yaml 文件"""
+    source = (CUR_DIR / f'{lang}.yaml').read_bytes()
+    try:
+        with open(snapshot_file(lang), 'r', encoding='utf-8') as f:
+            snapshot = json.load(f)
+        if snapshot.get('source_hash') == hashlib.sha1(source).hexdigest():
+            return snapshot['data']
+    except (OSError, ValueError):
+        pass
+
+    import yaml
+
+    return yaml.safe_load(source.decode('utf-8'))
+
+
+@lru_cache(maxsize=None)
+def build_catalog(lang: str) -> Catalog:
+    fallback = load_catalog(FALLBACK_LANGUAGE) if lang != FALLBACK_LANGUAGE else None
+    return Catalog(load_catalog(lang), fallback)
 
 
-def i18n() -> DottedDict:
+def i18n() -> Catalog:
     lang: str = get_global_config_value('lang', 'en_US')
     if 'en' in lang.lower():
         lang = 'en_US'
@@ -31,7 +112,4 @@ def i18n() -> DottedDict:
     else:
         raise ValueError(f'Invalid language: {lang}')
 
-    i18n_file = CUR_DIR / f'{lang}.yaml'
-    with open(i18n_file, 'r', encoding='utf-8') as f:
-        data = yaml.safe_load(f)
-    return DottedDict(data)
+    return build_catalog(lang)
@@ -0,0 +1,6 @@
+# 重新生成界面文本的 JSON 快照: python -m auto_i18n.i18n
+from auto_i18n.i18n import LANGUAGES, build_snapshot, snapshot_file
+
+for lang in LANGUAGES:
+    build_snapshot(lang)
+    print(f'Generated {snapshot_file(lang)}')
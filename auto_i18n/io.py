@@ -1,66 +1,162 @@
 import json
+import mmap
 import os
+import shutil
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 from typing import Union
 
 import yaml
 
+from auto_i18n.utils.profile import profiled
+
+try:
+    import orjson
+except ImportError:  # 可选依赖, 没有安装时使用标准库的 json
+    orjson = None
+
 FilePath = Union[Path, str]
 
+# 优先使用 libyaml 提供的 C 实现, 解析和输出大文件时快一个数量级
+YamlLoader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+
+
+class YamlDumper(getattr(yaml, 'CSafeDumper', yaml.SafeDumper)):
+    """多行文本使用 | 块格式输出的 Dumper"""
+
+
+class PyYamlDumper(yaml.SafeDumper):
+    """纯 Python 实现的 YamlDumper"""
+
+
+def _str_presenter(dumper, data):
+    if len(data.splitlines()) > 1:  # check for multiline string
+        return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
+    return dumper.represent_scalar('tag:yaml.org,2002:str', data)
+
+
+YamlDumper.add_representer(str, _str_presenter)
+PyYamlDumper.add_representer(str, _str_presenter)
+
 
 def file_reader(file_path: FilePath):
     return open(file_path, 'r', encoding='utf-8')
 
 
 def file_writer(file_path: FilePath):
+    """直接写入文件; 需要保证目标文件始终完整时请使用 atomic_writer"""
     return open(file_path, 'w', encoding='utf-8')
 
 
+@contextmanager
+def atomic_writer(file_path: FilePath):
+    """先写入同一目录下的临时文件, 成功之后再通过 os.replace 替换目标文件
+
+    写入过程中程序崩溃或者出错时, 原来的文件保持不变; 已有文件的权限会被保留。
+    file_path 是符号链接时写入其指向的文件, 链接本身保持不变
+    """
+    file_path = Path(file_path).resolve()
+    temp_path = file_path.with_name(
+        f'.{file_path.name}.{os.getpid()}.{threading.get_ident()}.tmp'
+    )
+    try:
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            yield f
+            f.flush()
+            os.fsync(f.fileno())
+        if file_path.exists():
+            shutil.copymode(file_path, temp_path)
+        os.replace(temp_path, file_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except OSError:
+            pass
+        raise
+
+
+@profiled()
 def read_file(file_path: FilePath):
     with file_reader(file_path) as f:
         return f.read()
 
 
+# 小于该大小的文件直接读取, mmap 的系统调用开销反而更大
+MMAP_THRESHOLD = 64 * 1024
+
+
+@contextmanager
+def mapped_file(file_path: FilePath):
+    """以只读的方式将文件映射到内存, 返回 bytes-like 对象; 小文件直接读取为 bytes"""
+    with open(file_path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < MMAP_THRESHOLD:
+            yield f.read()
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            yield data
+
+
+def decode_text(data) -> str:
+    """与 read_file 的结果相同: 按照 utf-8 解码, 并统一换行符"""
+    text = str(data, 'utf-8')
+    if '\r' in text:
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+    return text
+
+
+@profiled()
 def write_file(file_path: FilePath, content: str):
-    with file_writer(file_path) as f:
+    with atomic_writer(file_path) as f:
         f.write(content)
 
 
+@profiled()
 def read_yaml(file_path: FilePath):
     if Path(file_path).exists():
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
-                return yaml.safe_load(f)
+                return yaml.load(f, Loader=YamlLoader)
         except yaml.YAMLError:
             return {}
     return {}
 
 
+@profiled()
 def write_yaml(file_path: FilePath, data: dict):
-    def str_presenter(dumper, data):
-        if len(data.splitlines()) > 1:  # check for multiline string
-            return dumper.represent_scalar('tag:yaml.org,2002:str', data, style='|')
-        return dumper.represent_scalar('tag:yaml.org,2002:str', data)
-
-    yaml.add_representer(str, str_presenter)
-
-    with open(file_path, 'w', encoding='utf-8') as f:
-        yaml.dump(data, f, default_flow_style=False, allow_unicode=True)
+    options = {'default_flow_style': False, 'allow_unicode': True}
+    content = yaml.dump(data, Dumper=YamlDumper, **options)
+    if '\\U' in content:
+        # libyaml 会将 emoji 等 BMP 之外的字符转义为 \UXXXXXXXX, 此时改用纯 Python 实现
+        content = yaml.dump(data, Dumper=PyYamlDumper, **options)
+    with atomic_writer(file_path) as f:
+        f.write(content)
 
 
+@profiled()
 def read_json(file_path: FilePath):
     if Path(file_path).exists():
         try:
+            if orjson is not None:
+                return orjson.loads(Path(file_path).read_bytes())
             with open(file_path, 'r', encoding='utf-8') as f:
                 return json.load(f)
-        except json.JSONDecodeError:
+        except json.JSONDecodeError:  # orjson.JSONDecodeError 是它的子类
             return {}
     return {}
 
 
+@profiled()
 def write_json(file_path: FilePath, data: dict):
-    with open(file_path, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    if orjson is not None:
+        content = orjson.dumps(
+            data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS
+        ).decode('utf-8')
+    else:
+        content = json.dumps(data, ensure_ascii=False, indent=2)
+    with atomic_writer(file_path) as f:
+        f.write(content)
 
 
 # 根据文件后缀名，自动选择对应的读写函数
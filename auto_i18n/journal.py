@@ -0,0 +1,123 @@
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Optional
+
+from auto_i18n import io
+from auto_i18n.config import get_global_config_value
+from auto_i18n.gpt import request_json
+from auto_i18n.i18n import i18n
+from auto_i18n.utils import PROFILER, echo
+from auto_i18n.utils.string import replace_vars
+
+I18N = i18n()
+
+JOURNAL_FILE = '.auto-i18n.{command}.journal.jsonl'
+
+JOURNAL_VERSION = 1
+
+
+class RunJournal:
+    """记录一次 extract / translate 运行中每个已经完成的 GPT 请求及其回复
+
+    每个请求完成后立即追加一行并写入磁盘; 运行中断 (网络错误、Ctrl-C 等) 之后,
+    使用 --resume 重新运行时, prompt 和模型都相同的请求直接使用记录中的回复, 不会再次请求
+    GPT。运行正常结束之后删除该文件; 不使用 --resume 时, 之前的记录会被新的记录覆盖
+    """
+
+    def __init__(
+        self, command: str, resume: bool = False, path: Optional[io.FilePath] = None
+    ):
+        self.path = Path(path or JOURNAL_FILE.format(command=command))
+        self.model = get_global_config_value('GPT.model', '')
+        # 上一次运行没有正常结束
+        self.interrupted = self.path.exists()
+        entries = self._load() if resume and self.interrupted else None
+        self.entries: dict[str, str] = entries or {}
+        # 不复用之前的记录时, 在写入第一条新记录时才清空文件, 以便在此之前仍然可以中止
+        self._append = entries is not None
+        self.replayed = 0
+        self._lock = threading.Lock()
+        self._file = None
+
+    def _load(self) -> Optional[dict[str, str]]:
+        """读取之前的记录, 版本不匹配或者没有记录时返回 None"""
+        entries = {}
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for index, line in enumerate(f):
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    # 写入到一半时中断的最后一行
+                    continue
+                if index == 0:
+                    if record.get('version') != JOURNAL_VERSION:
+                        return None
+                    continue
+                entries[record['key']] = record['result']
+        return entries or None
+
+    def key(self, prompt: str) -> str:
+        return hashlib.sha1(f'{self.model}\0{prompt}'.encode('utf-8')).hexdigest()
+
+    def request_json(self, prompt: str, retries: int = 0):
+        """与 gpt.request_json 相同; 记录中已有该请求的回复时直接返回, 不请求 GPT"""
+        key = self.key(prompt)
+        raw = self.entries.get(key)
+        if raw is not None:
+            with self._lock:
+                self.replayed += 1
+            PROFILER.count('journal.replayed')
+            return json.loads(raw), raw
+
+        result, raw = request_json(prompt, retries)
+        # 只记录成功解析的回复, 失败的请求在 --resume 时会重新发送
+        if result is not None:
+            self.record(key, raw)
+        return result, raw
+
+    def record(self, key: str, result: str):
+        line = json.dumps({'key': key, 'result': result}, ensure_ascii=False)
+        with self._lock:
+            if self._file is None:
+                if self._append:
+                    self._file = open(self.path, 'a', encoding='utf-8')
+                else:
+                    self._file = open(self.path, 'w', encoding='utf-8')
+                    self._file.write(json.dumps({'version': JOURNAL_VERSION}) + '\n')
+            self._file.write(line + '\n')
+            self._file.flush()
+            self.entries[key] = result
+
+    def finish(self):
+        """运行正常结束, 删除记录文件"""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            if self.path.exists():
+                os.remove(self.path)
+
+
+def start_journal(command: str, resume: bool = False) -> RunJournal:
+    """创建 command 的运行记录, 并提示之前中断的运行"""
+    journal = RunJournal(command, resume)
+    if resume and journal.entries:
+        echo.info(
+            replace_vars(
+                I18N.journal_py.resumed,
+                {'count': len(journal.entries), 'path': str(journal.path)},
+            )
+        )
+    elif journal.interrupted and not resume:
+        echo.warning(replace_vars(I18N.journal_py.discarded, {'command': command}))
+    return journal
+
+
+def finish_journal(journal: RunJournal):
+    """运行正常结束: 删除运行记录, 并输出复用的请求数量"""
+    if journal.replayed:
+        echo.info(replace_vars(I18N.journal_py.replayed, {'count': journal.replayed}))
+    journal.finish()
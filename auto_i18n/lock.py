@@ -0,0 +1,57 @@
+from pathlib import Path
+from typing import Optional
+
+from auto_i18n import io
+from auto_i18n.utils import fingerprint, flatten_object, unflatten_object
+
+LOCK_FILE = 'auto-i18n.lock.json'
+
+LOCK_VERSION = 1
+
+
+class TranslationLock:
+    """记录每个翻译文件中各个 key 在上次翻译时对应的原文指纹
+
+    translate 的 diff 策略据此找出主文件中被修改过的文本, 只重新翻译这些 key;
+    主文件 (main_file) 发生变化时, 之前的记录全部作废。
+    该文件应当与 i18n 文件一起提交到版本库中
+    """
+
+    def __init__(self, source: str, path: io.FilePath = LOCK_FILE):
+        self.path = Path(path)
+        self.source = source
+        data = io.read_json(self.path) or {}
+        if data.get('version') == LOCK_VERSION and data.get('source') == source:
+            self.files: dict[str, dict] = data.get('files', {})
+        else:
+            self.files = {}
+
+    def get(self, target: str) -> Optional[dict]:
+        """返回翻译文件 target 的指纹记录, 没有记录时返回 None"""
+        return self.files.get(target)
+
+    def update(self, target: str, source_obj: dict, translated: Optional[dict] = None):
+        """将 translated 中出现的 key 的指纹更新为 source_obj 中对应的当前原文
+
+        同时删除 source_obj 中已经不存在的 key 的记录
+        """
+        flat_source = flatten_object(source_obj)
+        flat = {
+            path: value
+            for path, value in flatten_object(self.files.get(target, {})).items()
+            if path in flat_source
+        }
+        for path in flatten_object(translated or {}):
+            if path in flat_source:
+                flat[path] = fingerprint(flat_source[path])
+        self.files[target] = unflatten_object(flat)
+
+    def save(self):
+        io.write_json(
+            self.path,
+            {
+                'version': LOCK_VERSION,
+                'source': self.source,
+                'files': {key: self.files[key] for key in sorted(self.files)},
+            },
+        )
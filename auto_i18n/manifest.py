@@ -0,0 +1,100 @@
+import hashlib
+import os
+from pathlib import Path
+from typing import Optional, TypedDict
+
+from auto_i18n import io
+
+MANIFEST_FILE = '.auto-i18n.manifest.json'
+
+# 2: 哈希改为基于文件的原始字节
+MANIFEST_VERSION = 2
+
+
+class ManifestEntry(TypedDict):
+    mtime: int
+    size: int
+    # 没有通过 i18n_pattern 预先过滤的文件不计算哈希, 为 None
+    hash: Optional[str]
+    markers: bool
+
+
+def hash_bytes(data) -> str:
+    return hashlib.sha1(data).hexdigest()
+
+
+def hash_content(content: str) -> str:
+    return hash_bytes(content.encode('utf-8'))
+
+
+class ScanManifest:
+    """记录 extract 扫描过的代码文件的状态, 用于跳过没有变化的文件
+
+    每个文件记录 mtime、大小、内容哈希以及是否包含 i18n 标记;
+    i18n_pattern 发生变化时, 之前的记录全部作废
+    """
+
+    def __init__(self, pattern: str, path: io.FilePath = MANIFEST_FILE):
+        self.path = Path(path)
+        self.pattern = pattern
+        data = io.read_json(self.path) or {}
+        if data.get('version') == MANIFEST_VERSION and data.get('pattern') == pattern:
+            self.entries: dict[str, ManifestEntry] = data.get('files', {})
+        else:
+            self.entries = {}
+        self._seen: set[str] = set()
+
+    @staticmethod
+    def key(file_path: Path) -> str:
+        return Path(file_path).as_posix()
+
+    def is_unchanged(self, file_path: Path, stat: os.stat_result) -> bool:
+        """文件的 mtime 和大小都没有变化, 并且上次扫描时没有 i18n 标记"""
+        entry = self.entries.get(self.key(file_path))
+        return (
+            entry is not None
+            and not entry['markers']
+            and entry['mtime'] == stat.st_mtime_ns
+            and entry['size'] == stat.st_size
+        )
+
+    def get(self, file_path: Path) -> Optional[ManifestEntry]:
+        return self.entries.get(self.key(file_path))
+
+    def touch(self, file_path: Path):
+        """标记文件在本次扫描中仍然存在"""
+        self._seen.add(self.key(file_path))
+
+    def update(self, file_path: Path, content: str, markers: bool):
+        stat = Path(file_path).stat()
+        self.record(
+            file_path, stat.st_mtime_ns, stat.st_size, hash_content(content), markers
+        )
+
+    def record(
+        self,
+        file_path: Path,
+        mtime: int,
+        size: int,
+        content_hash: Optional[str],
+        markers: bool,
+    ):
+        """记录已经计算好的文件状态 (例如由扫描进程返回的结果)"""
+        key = self.key(file_path)
+        self._seen.add(key)
+        self.entries[key] = {
+            'mtime': mtime,
+            'size': size,
+            'hash': content_hash,
+            'markers': markers,
+        }
+
+    def save(self):
+        # 只保留本次扫描中出现过的文件
+        files = {
+            key: self.entries[key] for key in sorted(self._seen) if key in self.entries
+        }
+        io.write_json(
+            self.path,
+            {'version': MANIFEST_VERSION, 'pattern': self.pattern, 'files': files},
+        )
@@ -0,0 +1,99 @@
+from pathlib import Path
+from typing import Optional, TypedDict
+
+from auto_i18n import io
+from auto_i18n.manifest import hash_content
+
+PLAN_FILE = 'auto-i18n.plan.json'
+
+PLAN_VERSION = 1
+
+
+class Replacement(TypedDict):
+    start: int
+    end: int
+    key: str
+    text: str
+
+
+class PlannedFile(TypedDict):
+    hash: str
+    # 替换之后的内容的哈希, 用于识别已经应用过计划的文件
+    result: str
+    replacements: list[Replacement]
+
+
+def apply_replacements(code: str, replacements: list[Replacement], prefix: str) -> str:
+    """将 code 中 [start, end) 范围内的文本依次替换为 {prefix}.{key}"""
+    parts = []
+    position = 0
+    for replacement in sorted(replacements, key=lambda r: r['start']):
+        parts.append(code[position : replacement['start']])
+        parts.append(f'{prefix}.{replacement["key"]}')
+        position = replacement['end']
+    parts.append(code[position:])
+    return ''.join(parts)
+
+
+class ExtractPlan:
+    """extract --plan 生成的提取计划: 每个代码文件中需要替换的位置、对应的 key,
+    以及需要加入主 i18n 文件的新文本
+
+    生成计划时不会修改任何文件; extract --apply 根据计划一次性完成所有替换,
+    不需要请求 GPT。代码文件或者主文件在生成计划之后发生了变化时, 计划中记录的
+    哈希不再匹配, 对应的部分会被跳过
+    """
+
+    def __init__(
+        self,
+        prefix: str,
+        main_hash: Optional[str] = None,
+        path: io.FilePath = PLAN_FILE,
+    ):
+        self.path = Path(path)
+        self.prefix = prefix
+        self.main_hash = main_hash
+        self.i18n: dict[str, dict] = {}
+        self.files: dict[str, PlannedFile] = {}
+
+    @classmethod
+    def load(cls, path: io.FilePath = PLAN_FILE) -> Optional['ExtractPlan']:
+        """读取计划文件, 文件不存在或者版本不匹配时返回 None"""
+        data = io.read_json(path)
+        if not data or data.get('version') != PLAN_VERSION:
+            return None
+        plan = cls(data['prefix'], data.get('main_hash'), path)
+        plan.i18n = data.get('i18n', {})
+        plan.files = data.get('files', {})
+        return plan
+
+    def add_file(self, file_path: Path, code: str, replacements: list[Replacement]):
+        result = apply_replacements(code, replacements, self.prefix)
+        self.files[Path(file_path).as_posix()] = {
+            'hash': hash_content(code),
+            'result': hash_content(result),
+            'replacements': replacements,
+        }
+
+    def is_applied(self, file_path: io.FilePath, code: str) -> bool:
+        entry = self.files.get(Path(file_path).as_posix())
+        return entry is not None and entry['result'] == hash_content(code)
+
+    def apply(self, file_path: io.FilePath, code: str) -> Optional[str]:
+        """返回替换之后的代码; 文件不在计划中或者内容已经发生变化时返回 None"""
+        entry = self.files.get(Path(file_path).as_posix())
+        if entry is None or entry['hash'] != hash_content(code):
+            return None
+        return apply_replacements(code, entry['replacements'], self.prefix)
+
+    def save(self):
+        io.write_json(
+            self.path,
+            {
+                'version': PLAN_VERSION,
+                'prefix': self.prefix,
+                'main_hash': self.main_hash,
+                'i18n': self.i18n,
+                'files': self.files,
+            },
+        )
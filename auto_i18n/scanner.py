@@ -0,0 +1,364 @@
+import json
+import os
+import re
+from pathlib import Path
+from typing import Iterable, Iterator, NamedTuple, Optional, Union
+
+from auto_i18n.io import decode_text, mapped_file
+from auto_i18n.manifest import hash_bytes
+from auto_i18n.utils import profiled
+
+try:
+    import re._parser as sre_parse  # Python 3.11+
+except ImportError:
+    import sre_parse
+
+PatternConfig = Union[str, list[str], dict[str, Union[str, list[str]]]]
+
+# 按扩展名配置 i18n_pattern 时, 匹配其他所有文件的 key
+DEFAULT_EXTENSION = '*'
+
+# 源代码中常见的字节, 大致按照出现频率从高到低排列
+COMMON_BYTES = b' \netaoinsrlcdupmhgfbywvkxjqz()._;,=\'"{}:0123456789/-<>[]\t*+!&|?#'
+
+# scan_workers 为 0 (自动) 时, 需要扫描的文件达到该数量才使用进程池
+PROCESS_POOL_THRESHOLD = 500
+
+
+def normalize_extension(extension: str) -> str:
+    """'ts'、'.ts'、'*.ts' 都统一为 '.ts'"""
+    if extension == DEFAULT_EXTENSION:
+        return extension
+    return '.' + extension.lstrip('*').lstrip('.').lower()
+
+
+def pattern_key(config: PatternConfig) -> str:
+    """i18n_pattern 配置的稳定字符串表示, 用于判断配置是否发生了变化"""
+    if isinstance(config, str):
+        return config
+    return json.dumps(config, ensure_ascii=False, sort_keys=True)
+
+
+def literal_prefix(pattern: str) -> str:
+    """返回 pattern 的每个匹配都必须以之开头的字面量, 例如默认 pattern 的前缀为 ((`
+
+    无法确定时 (以分支、字符集等开头, 或者忽略大小写) 返回空字符串
+    """
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return ''
+    if parsed.state.flags & re.IGNORECASE:
+        return ''
+    chars: list[str] = []
+    _collect_literals(parsed, chars)
+    return ''.join(chars)
+
+
+def rarest_byte(prefix: bytes) -> bytes:
+    """返回 prefix 中在源代码里最少见的一个字节"""
+
+    def rank(byte: int) -> int:
+        index = COMMON_BYTES.find(bytes([byte]))
+        return len(COMMON_BYTES) if index == -1 else index
+
+    return bytes([max(prefix, key=rank)])
+
+
+def has_backreference(pattern: str) -> bool:
+    """pattern 中是否包含对分组的引用 (\\1、(?P=name)、(?(1)...) 等)
+
+    合并之后分组的序号会发生变化, 这样的 pattern 不能与其他 pattern 合并
+    """
+    try:
+        return _has_groupref(sre_parse.parse(pattern))
+    except re.error:
+        return False
+
+
+def _has_groupref(value) -> bool:
+    if isinstance(value, sre_parse.SubPattern):
+        return any(
+            op in (sre_parse.GROUPREF, sre_parse.GROUPREF_EXISTS) or _has_groupref(av)
+            for op, av in value
+        )
+    if isinstance(value, (tuple, list)):
+        return any(_has_groupref(item) for item in value)
+    return False
+
+
+def _collect_literals(items, chars: list[str]) -> bool:
+    """将 items 开头连续的字面量加入 chars, items 全部是字面量时返回 True"""
+    for op, av in items:
+        if op == sre_parse.LITERAL:
+            chars.append(chr(av))
+        elif op == sre_parse.SUBPATTERN:
+            _, add_flags, _, sub_items = av
+            if add_flags & re.IGNORECASE or not _collect_literals(sub_items, chars):
+                return False
+        else:
+            return False
+    return True
+
+
+class InvalidPatternError(ValueError):
+    """i18n_pattern 中的正则表达式无法编译"""
+
+    def __init__(self, pattern, error: str):
+        super().__init__(f'Invalid i18n_pattern {pattern!r}: {error}')
+        self.pattern = pattern
+        self.error = error
+
+
+def compile_pattern(pattern: str) -> re.Pattern:
+    if not isinstance(pattern, str):
+        raise InvalidPatternError(pattern, 'not a string')
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        raise InvalidPatternError(pattern, str(e)) from None
+
+
+class CombinedPattern:
+    """将多个 i18n_pattern 合并为一个正则表达式, 对文本只扫描一遍
+
+    每个 pattern 的第一个捕获组 (没有捕获组时为整个匹配) 是需要翻译的文本, 其他分组
+    需要使用非捕获组 (?:...); 例如以 (['"]) 匹配引号的 pattern, 得到的文本是引号本身。
+    只有一个 pattern 时直接使用它本身, 与之前的行为完全一致。
+    pattern 之间无法合并时 (引用了分组, 或者定义了同名的组), 分别匹配每个 pattern,
+    再按照起始位置合并匹配结果
+    """
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(dict.fromkeys(patterns))
+        if not self.patterns:
+            raise InvalidPatternError(self.patterns, 'no pattern')
+        self.compiled = [compile_pattern(pattern) for pattern in self.patterns]
+        # 每个 pattern 的字面量前缀; 有任何一个 pattern 没有前缀时无法预先过滤
+        prefixes = [literal_prefix(p).encode('utf-8') for p in self.patterns]
+        self.prefixes = tuple(prefixes) if all(prefixes) else None
+        self._prefilters = [(rarest_byte(p), p) for p in self.prefixes or ()]
+        if len(self.patterns) == 1:
+            self.regex = self.compiled[0]
+            self._groups = [0 if self.regex.groups == 0 else 1]
+            self._outer = None
+            return
+
+        # 每个 pattern 用一个外层捕获组包裹, 记录外层组以及其第一个内部组的序号
+        self._outer = []
+        self._groups = []
+        index = 1
+        for compiled in self.compiled:
+            groups = compiled.groups
+            self._outer.append(index)
+            self._groups.append(index + 1 if groups else index)
+            index += groups + 1
+        if any(has_backreference(pattern) for pattern in self.patterns):
+            # 合并之后引用会指向其他分组, 即使能够编译也会得到错误的匹配
+            self.regex = None
+            return
+        try:
+            self.regex = re.compile(
+                '|'.join(f'({pattern})' for pattern in self.patterns)
+            )
+        except re.error:
+            # 同名的组在合并之后发生了冲突
+            self.regex = None
+
+    def may_match(self, data) -> bool:
+        """在未解码的文件内容中查找字面量前缀, 返回 False 时一定没有匹配
+
+        先查找前缀中最少见的单个字节 (memchr, 比查找整个前缀快得多), 找到时才查找整个前缀
+        """
+        if self.prefixes is None:
+            return True
+        return any(
+            data.find(byte) != -1 and data.find(prefix) != -1
+            for byte, prefix in self._prefilters
+        )
+
+    def text(self, match: re.Match) -> str:
+        if self._outer is None:
+            return match.group(self._groups[0])
+        for outer, group in zip(self._outer, self._groups):
+            if match.group(outer) is not None:
+                return match.group(group)
+        return match.group(0)
+
+    def _separate_matches(self, code: str) -> Iterator[re.Match]:
+        """分别匹配每个 pattern, 与合并之后的正则表达式一样返回互不重叠的匹配:
+        每次取起始位置最靠前的匹配 (位置相同时取排在前面的 pattern), 再从其结束位置继续
+        """
+        position = 0
+        upcoming = [compiled.search(code) for compiled in self.compiled]
+        while position <= len(code):
+            best = None
+            for index, match in enumerate(upcoming):
+                if match is not None and match.start() < position:
+                    match = self.compiled[index].search(code, position)
+                    upcoming[index] = match
+                if match is not None and (best is None or match.start() < best.start()):
+                    best = match
+            if best is None:
+                return
+            yield best
+            position = max(best.end(), best.start() + 1)
+
+    def finditer(self, code: str) -> Iterator[tuple[re.Match, str]]:
+        """返回每个匹配及其文本"""
+        if self.regex is not None:
+            for match in self.regex.finditer(code):
+                yield match, self.text(match)
+            return
+        for match in self._separate_matches(code):
+            yield match, match.group(1 if match.re.groups else 0)
+
+    def findall(self, code: str) -> list[str]:
+        return [text for _, text in self.finditer(code)]
+
+    def spans(self, code: str) -> Iterator[tuple[int, int, str]]:
+        """返回每个匹配的 (起始位置, 结束位置, 文本)"""
+        for match, text in self.finditer(code):
+            yield match.start(), match.end(), text
+
+
+class Scanner:
+    """根据 i18n_pattern 配置扫描代码文件中的 i18n 文本
+
+    i18n_pattern 可以是单个正则表达式、多个正则表达式的列表, 或者按照文件扩展名
+    配置的 dict (例如 {'.ts': ..., '.py': [...], '*': ...}, '*' 匹配其他所有文件);
+    同一个文件适用的所有 pattern 会被合并为一个正则表达式, 每个文件只扫描一遍
+    """
+
+    def __init__(self, config: PatternConfig):
+        self.config = config
+        self.key = pattern_key(config)
+        self._by_extension: dict[str, CombinedPattern] = {}
+        self._default: Optional[CombinedPattern] = None
+
+        if isinstance(config, dict):
+            for extension, patterns in config.items():
+                if isinstance(patterns, str):
+                    patterns = [patterns]
+                elif not isinstance(patterns, list):
+                    raise InvalidPatternError(patterns, 'expected a string or list')
+                extension = normalize_extension(extension)
+                if extension == DEFAULT_EXTENSION:
+                    self._default = CombinedPattern(patterns)
+                else:
+                    self._by_extension[extension] = CombinedPattern(patterns)
+        elif isinstance(config, (str, list)):
+            self._default = CombinedPattern(
+                [config] if isinstance(config, str) else config
+            )
+        else:
+            raise InvalidPatternError(config, 'expected a string, list or dict')
+
+    def pattern_for(self, file_path: Union[Path, str]) -> Optional[CombinedPattern]:
+        """返回文件适用的 pattern; 没有适用的 pattern 时返回 None"""
+        extension = Path(file_path).suffix.lower()
+        return self._by_extension.get(extension, self._default)
+
+    @profiled('scan.regex')
+    def findall(self, code: str, file_path: Union[Path, str]) -> list[str]:
+        pattern = self.pattern_for(file_path)
+        return pattern.findall(code) if pattern is not None else []
+
+    def spans(
+        self, code: str, file_path: Union[Path, str]
+    ) -> Iterator[tuple[int, int, str]]:
+        pattern = self.pattern_for(file_path)
+        return pattern.spans(code) if pattern is not None else iter(())
+
+
+def collect_files(directory, globs: Iterable[str]) -> list[Path]:
+    """按照 code_files 中的各个 glob 收集文件, 多个 glob 匹配到的同一个文件只保留一次"""
+    files: dict[Path, None] = {}
+    for pattern in globs:
+        for file_path in sorted(Path(directory).glob(pattern)):
+            if file_path.is_file():
+                files.setdefault(file_path, None)
+    return list(files)
+
+
+class ScanResult(NamedTuple):
+    path: Path
+    mtime: int
+    size: int
+    # 没有通过预先过滤的文件不计算哈希, 为 None
+    hash: Optional[str]
+    # 文件内容的哈希与 known_hash 相同时不会重新匹配, 为 None
+    lines: Optional[list[str]]
+    # 只有包含 i18n 标记的文件才会返回内容
+    code: Optional[str]
+
+
+def scan_file(
+    scanner: Scanner, file_path: Path, known_hash: Optional[str] = None
+) -> ScanResult:
+    """读取并扫描一个代码文件
+
+    文件被映射到内存中, 先在原始字节中查找 pattern 的字面量前缀, 只有找到时才计算哈希、
+    解码并完整匹配 (查找前缀比计算哈希快, 没有找到的文件不需要哈希);
+    known_hash 为上次扫描时 (没有 i18n 标记的) 文件的哈希, 没有变化时跳过匹配
+    """
+    stat = os.stat(file_path)
+    pattern = scanner.pattern_for(file_path)
+    content_hash, lines, code = None, None, None
+    with mapped_file(file_path) as data:
+        if pattern is None or not pattern.may_match(data):
+            lines = []
+        else:
+            content_hash = hash_bytes(data)
+            if content_hash != known_hash:
+                text = decode_text(data)
+                lines = scanner.findall(text, file_path)
+                code = text if lines else None
+    return ScanResult(
+        file_path, stat.st_mtime_ns, stat.st_size, content_hash, lines, code
+    )
+
+
+_worker_scanner: Optional[Scanner] = None
+
+
+def _init_worker(config: PatternConfig):
+    global _worker_scanner
+    _worker_scanner = Scanner(config)
+
+
+def _scan_in_worker(task: tuple[Path, Optional[str]]) -> ScanResult:
+    return scan_file(_worker_scanner, *task)
+
+
+def resolve_workers(workers: Optional[int], files: int) -> int:
+    """scan_workers 为 0 或 None 时, 文件足够多才按照 CPU 核数使用进程池"""
+    if workers:
+        return workers
+    if files < PROCESS_POOL_THRESHOLD:
+        return 1
+    return os.cpu_count() or 1
+
+
+def scan_files(
+    scanner: Scanner, tasks: list[tuple[Path, Optional[str]]], workers: int = 1
+) -> Iterator[ScanResult]:
+    """扫描 tasks 中的 (文件路径, known_hash), 按照原始顺序返回 ScanResult
+
+    workers > 1 时在进程池中读取和匹配文件, 主进程只需要处理包含 i18n 标记的文件;
+    没有标记的文件只返回 mtime、大小和哈希, 不会把文件内容传回主进程
+    """
+    if workers <= 1 or len(tasks) <= 1:
+        for task in tasks:
+            yield scan_file(scanner, *task)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    workers = min(workers, len(tasks))
+    # 每个子进程一次领取一批文件, 减少进程间通信的次数
+    chunksize = max(1, min(64, len(tasks) // (workers * 4)))
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=_init_worker, initargs=(scanner.config,)
+    ) as executor:
+        yield from executor.map(_scan_in_worker, tasks, chunksize=chunksize)
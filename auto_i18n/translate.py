@@ -1,31 +1,51 @@
 import json
+from collections import Counter
 from pathlib import Path
+from typing import Optional
 
 import click
 
 from auto_i18n import io
+from auto_i18n.cache import TranslationCache, get_cache, hash_text, prune_cache
 from auto_i18n.config import (
+    DEFAULT_GLOBAL_CONFIG,
     PROMPT_TRANSLATE_TEXT,
     get_global_config_value,
     get_project_config,
 )
-from auto_i18n.gpt import send_gpt_request
+from auto_i18n.gpt import is_streaming, send_gpt_request
 from auto_i18n.i18n import i18n
+from auto_i18n.journal import finish_journal, start_journal
+from auto_i18n.lock import TranslationLock
 from auto_i18n.utils import (
+    PROFILER,
+    chunk_objects,
     diff_objects,
     echo,
-    ensure_no_md_code_block,
+    flatten_object,
+    iter_text_chunks,
+    json_size,
+    map_concurrently,
     merge_objects,
+    profiled,
+    prune_object,
     replace_vars,
+    unflatten_object,
 )
 from auto_i18n.utils.string import to_md_list
 
 I18N = i18n()
 
 
-def translate_i18n(full=None):
+def translate_i18n(full=None, jobs=None, multi=None, resume=False):
+    """翻译主 i18n 文件到 i18n_dir 中的其他语言文件
+
+    resume 为 True 时复用上一次中断的运行中已经完成的 GPT 请求 (见 RunJournal)
+    """
     config = get_project_config()
     strategy = full if full is not None else config.get('strategy', 'diff')
+    jobs = jobs if jobs is not None else config.get('concurrency', 1)
+    multi = multi if multi is not None else config.get('multi_target', False)
     i18n_dir = Path(config.get('i18n_dir', 'src/i18n'))
     main_file = config.get('main_file', 'zh_CN.yaml')
 
@@ -36,7 +56,7 @@ def translate_i18n(full=None):
         click.echo(click.style(I18N.translate.no_data, fg='red'))
         return
 
-    out_files = list(i18n_dir.glob(f'*.{main_file.split(".")[-1]}'))
+    out_files = sorted(i18n_dir.glob(f'*.{main_file.split(".")[-1]}'))
     out_files = [f for f in out_files if f != main_file_path]
 
     PROMPT = get_global_config_value('prompt.translate', default='')
@@ -45,69 +65,402 @@ def translate_i18n(full=None):
         click.echo(click.style(I18N.translate.no_prompt, fg='red'))
         return
 
-    for out_file in out_files:
-        out_obj = io.read_i18n_file(out_file)
+    PROMPT_MULTI = get_global_config_value(
+        'prompt.translateMulti', DEFAULT_GLOBAL_CONFIG['prompt']['translateMulti']
+    )
 
-        echo.info(
-            replace_vars((I18N.translatepy.starttranslationfile), {'file': out_file})
-        )
+    batch_size = config.get('batch_size', 6000)
+    max_retries = config.get('max_retries', 2)
+    max_targets = config.get('multi_target_max', 8) if multi else 1
+    vocabulary = to_md_list(config.get('dict', 'No'))
 
-        if out_obj is None:
-            out_obj = {}
+    cache = get_cache()
+    model = get_global_config_value('GPT.model', '')
+    # 多目标模式的翻译结果与逐个文件翻译的结果等价, 共用同一个缓存 key
+    prompt_hash = hash_text(PROMPT, vocabulary)
+    lock = TranslationLock(main_file)
 
-        if strategy == 'diff':
-            to_translate = diff_objects(in_obj, out_obj)
-            echo.debug((I18N.translatepy.usediffstrategy))
-            echo.debug(to_translate)
-        else:
-            to_translate = in_obj
+    # 先顺序准备好每个文件的各个分批, 然后并发请求 GPT, 最后按顺序合并写入
+    with PROFILER.phase('translate.prepare'):
+        pending = []
+        tasks = []
+        for out_file in out_files:
+            out_obj = io.read_i18n_file(out_file)
 
-        if len(to_translate) == 0:
-            echo.warning((I18N.translatepy.notranslationcontent))
-            continue
+            echo.info(
+                replace_vars(
+                    (I18N.translatepy.starttranslationfile), {'file': out_file}
+                )
+            )
 
-        prompt = replace_vars(
+            if out_obj is None:
+                out_obj = {}
+
+            removed = 0
+            if strategy == 'diff':
+                if lock.get(out_file.name) is None:
+                    # 第一次记录指纹时, 认为已有的翻译都是最新的
+                    lock.update(out_file.name, in_obj, out_obj)
+                to_translate = diff_objects(in_obj, out_obj, lock.get(out_file.name))
+                echo.debug((I18N.translatepy.usediffstrategy))
+                echo.debug(to_translate)
+
+                flat_out = flatten_object(out_obj)
+                changed = sum(path in flat_out for path in flatten_object(to_translate))
+                if changed:
+                    echo.debug(
+                        replace_vars(I18N.translatepy.changedkeys, {'count': changed})
+                    )
+
+                # 删除主文件中已经不存在的 key
+                pruned = prune_object(out_obj, in_obj)
+                removed = len(flat_out) - len(flatten_object(pruned))
+                if removed:
+                    echo.debug(
+                        replace_vars(I18N.translatepy.prunedkeys, {'count': removed})
+                    )
+                    out_obj = pruned
+            else:
+                to_translate = in_obj
+
+            if len(to_translate) == 0:
+                echo.warning((I18N.translatepy.notranslationcontent))
+                if removed:
+                    io.write_i18n_file(out_file, out_obj)
+                    lock.update(out_file.name, in_obj)
+                continue
+
+            cached = {}
+            if cache is not None:
+                to_translate, cached = split_cached(
+                    to_translate, cache, out_file.stem, model, prompt_hash
+                )
+                if cached:
+                    echo.debug(
+                        replace_vars(
+                            I18N.translatepy.cachehit,
+                            {'count': len(flatten_object(cached))},
+                        )
+                    )
+
+            merged = merge_objects(out_obj, cached)
+            pending.append((out_file, merged, cached, to_translate))
+
+        # 多目标模式下, 待翻译内容相同的文件共用同一组请求, 回复中包含每个文件的翻译;
+        # 按照每个请求中的文件数量 (与 plan_requests 相同, 尽量平均) 缩小分批,
+        # 使回复的大小仍然不超过 batch_size
+        sharing = Counter(content_key(task[3]) for task in pending)
+        for out_file, merged, cached, to_translate in pending:
+            shared = sharing[content_key(to_translate)]
+            targets = -(-shared // -(-shared // max_targets))
+            size = max(batch_size // targets, 1)
+            batches = chunk_objects(to_translate, size) if to_translate else []
+            if len(batches) > 1:
+                echo.debug(
+                    replace_vars(I18N.translatepy.splitbatches, {'count': len(batches)})
+                )
+            tasks.append((out_file, merged, cached, batches))
+
+    @profiled('translate.prompt')
+    def build_prompt(out_file: Path, batch: dict) -> str:
+        return replace_vars(
             PROMPT,
             {
                 'InFile': main_file,
                 'OutFile': out_file.name,
-                'Dict': to_md_list(config.get('dict', 'No')),
-                'I18n': json.dumps(to_translate, ensure_ascii=False),
+                'Dict': vocabulary,
+                'I18n': json.dumps(batch, ensure_ascii=False),
+            },
+        )
+
+    @profiled('translate.prompt')
+    def build_multi_prompt(files: list[Path], batch: dict) -> str:
+        return replace_vars(
+            PROMPT_MULTI,
+            {
+                'InFile': main_file,
+                'OutFiles': json.dumps([f.name for f in files], ensure_ascii=False),
+                'Dict': vocabulary,
+                'I18n': json.dumps(batch, ensure_ascii=False),
             },
         )
 
-        result = send_gpt_request(prompt)
-        result = ensure_no_md_code_block(result)
-        echo.debug((I18N.translatepy.getgpttranslationresult))
-        echo.debug(result)
+    # 每个完成的请求都会被记录下来, 中断之后可以通过 --resume 复用
+    journal = start_journal('translate', resume)
+    request = journal.request_json
+
+    def send(unit) -> dict[Path, tuple]:
+        files, _, batch = unit
+        if len(files) == 1:
+            return {files[0]: request(build_prompt(files[0], batch), max_retries)}
+
+        result, raw = request(build_multi_prompt(files, batch), max_retries)
+        results = {}
+        for out_file in files:
+            translated = result.get(out_file.name) if isinstance(result, dict) else None
+            if isinstance(translated, dict):
+                results[out_file] = (translated, raw)
+                continue
+            # 回复中缺少该文件或者格式不正确, 单独为该文件重新请求
+            echo.warning(
+                replace_vars(I18N.translatepy.multifallback, {'file': out_file})
+            )
+            results[out_file] = request(build_prompt(out_file, batch), max_retries)
+        return results
+
+    units = plan_requests(tasks, batch_size, max_targets)
+    if multi:
+        echo.debug(
+            replace_vars(
+                I18N.translatepy.multitarget,
+                {'files': len(tasks), 'count': len(units)},
+            )
+        )
 
-        try:
-            translated = json.loads(result)
-        except json.JSONDecodeError:
-            click.echo(click.style(I18N.translate.failed.format(file=out_file), fg='red'))
-            continue
+    @profiled('translate.write')
+    def write_result(task, translations: list[tuple]):
+        out_file, merged, done, batches = task
+        failed = 0
+        for batch, (translated, result) in zip(batches, translations):
+            echo.debug(
+                replace_vars(
+                    I18N.translatepy.getgpttranslationresult, {'file': out_file}
+                )
+            )
+            echo.debug(result)
+            if translated is None:
+                failed += 1
+                continue
+            merged = merge_objects(merged, translated)
+            done = merge_objects(done, translated)
+            if cache is not None:
+                cache.put_many(
+                    translated_pairs(batch, translated),
+                    out_file.stem,
+                    model,
+                    prompt_hash,
+                )
 
-        merged = merge_objects(out_obj, translated)
+        if batches and failed == len(batches):
+            click.echo(
+                click.style(I18N.translate.failed.format(file=out_file), fg='red')
+            )
+            return
 
         io.write_i18n_file(out_file, merged)
+        # 只记录成功翻译的 key, 失败的 key 在下一次运行时仍然会被重新翻译
+        lock.update(out_file.name, in_obj, done)
+
+        if failed:
+            click.echo(
+                click.style(
+                    I18N.translate.partial.format(
+                        file=out_file, failed=failed, total=len(batches)
+                    ),
+                    fg='yellow',
+                )
+            )
+        else:
+            click.echo(
+                click.style(I18N.translate.success.format(file=out_file), fg='green')
+            )
+
+    # 请求单元完成的顺序与文件的顺序不一定一致 (多目标模式下一个请求包含多个文件),
+    # 按文件顺序写入所有分批都已经完成的文件
+    translations = {task[0]: [None] * len(task[3]) for task in tasks}
+    pending = {task[0]: len(task[3]) for task in tasks}
+    written = 0
+
+    def write_finished():
+        nonlocal written
+        while written < len(tasks) and pending[tasks[written][0]] == 0:
+            task = tasks[written]
+            write_result(task, translations.pop(task[0]))
+            written += 1
+
+    try:
+        write_finished()
+        results = map_concurrently(send, units, jobs)
+        for (files, index, _), result in zip(units, results):
+            for out_file in files:
+                translations[out_file][index] = result[out_file]
+                pending[out_file] -= 1
+            write_finished()
+    finally:
+        # 中断时也要记录已经写入的文件, 否则它们的指纹会丢失
+        lock.save()
+    finish_journal(journal)
+
+    if cache is not None:
+        prune_cache(cache)
+        cache.close()
 
-        click.echo(click.style(I18N.translate.success.format(file=out_file), fg='green'))
 
+def content_key(obj) -> str:
+    """待翻译内容的稳定字符串表示, 用于找出待翻译内容相同的文件"""
+    return json.dumps(obj, ensure_ascii=False, sort_keys=True)
 
-def translate_file(in_file: str, out_file: str, lang: str = 'English'):
+
+def plan_requests(tasks, batch_size: int, max_targets: int = 1) -> list[tuple]:
+    """将各个文件的分批组合为请求单元 (目标文件列表, 分批序号, 分批)
+
+    max_targets > 1 时, 待翻译内容完全相同的文件共用同一组请求; 每个请求中的目标文件数量
+    根据分批的大小自适应, 使回复的大小 (约为分批大小乘以目标文件数量) 不超过 batch_size,
+    并且不超过 max_targets。共用的内容在 translate_i18n 中已经按照文件数量缩小了分批
+    """
+    groups: dict[str, list[tuple[Path, list[dict]]]] = {}
+    for out_file, _, _, batches in tasks:
+        if max_targets > 1:
+            key = content_key(batches)
+        else:
+            key = str(out_file)
+        groups.setdefault(key, []).append((out_file, batches))
+
+    units = []
+    for members in groups.values():
+        files = [out_file for out_file, _ in members]
+        for index, batch in enumerate(members[0][1]):
+            size = max(1, min(max_targets, batch_size // max(json_size(batch), 1)))
+            # 尽量让每个请求中的目标文件数量相同
+            count = -(-len(files) // size)
+            step = -(-len(files) // count)
+            for start in range(0, len(files), step):
+                units.append((files[start : start + step], index, batch))
+    return units
+
+
+def split_cached(
+    to_translate: dict,
+    cache: TranslationCache,
+    target: str,
+    model: str,
+    prompt_hash: str,
+) -> tuple[dict, dict]:
+    """从翻译记忆库中查找已经翻译过的文本
+
+    返回 (仍需翻译的部分, 命中缓存的翻译结果), 两者的结构都和 to_translate 一致
+    """
+    flat = flatten_object(to_translate)
+    sources = [value for value in flat.values() if isinstance(value, str)]
+    found = cache.get_many(sources, target, model, prompt_hash)
+    missed = {}
+    cached = {}
+    for path, value in flat.items():
+        if isinstance(value, str) and value in found:
+            cached[path] = found[value]
+        else:
+            missed[path] = value
+    return unflatten_object(missed), unflatten_object(cached)
+
+
+def translated_pairs(source: dict, translated: dict) -> list[tuple[str, str]]:
+    """按照相同的 key 路径, 将原文和译文一一对应"""
+    flat_translated = flatten_object(translated)
+    pairs = []
+    for path, value in flatten_object(source).items():
+        translation = flat_translated.get(path)
+        if isinstance(value, str) and isinstance(translation, str):
+            pairs.append((value, translation))
+    return pairs
+
+
+def translate_file(
+    in_file: str,
+    out_file: str,
+    lang: str = 'English',
+    chunked: bool = False,
+    jobs: Optional[int] = None,
+):
+    """翻译任意文本文件
+
+    chunked 为 True 时, 按照 Markdown 的结构边界将输入拆分为不超过 batch_size 的分块,
+    并发翻译后按顺序逐块写入输出文件; 输入是惰性读取的, 内存占用与文件大小无关。
+    不分块并且开启了 GPT.stream 时, 回复会在接收的同时写入输出文件
+    """
     config = get_project_config()
-    content = io.read_file(in_file)
-    prompt = replace_vars(
-        PROMPT_TRANSLATE_TEXT,
-        {
-            'Lang': lang,
-            'Dict': to_md_list(config.get('dict', 'No')),
-            'Content': content,
-        },
-    )
+    vocabulary = to_md_list(config.get('dict', 'No'))
+    if jobs is None:
+        jobs = config.get('concurrency', 1)
+
+    cache = get_cache()
+    model = get_global_config_value('GPT.model', '')
+    prompt_hash = hash_text(PROMPT_TRANSLATE_TEXT, vocabulary)
+
+    def translate_text(content: str, on_delta=None, on_restart=None) -> str:
+        result = cache.get(content, lang, model, prompt_hash) if cache else None
+        if result is not None:
+            echo.debug(replace_vars(I18N.translatepy.cachehit, {'count': 1}))
+            return result
+
+        prompt = replace_vars(
+            PROMPT_TRANSLATE_TEXT,
+            {
+                'Lang': lang,
+                'Dict': vocabulary,
+                'Content': content,
+            },
+        )
+
+        result = send_gpt_request(prompt, on_delta, on_restart)
+        if cache is not None:
+            cache.put(content, result, lang, model, prompt_hash)
+        return result
+
+    def translate_chunk(chunk: str) -> str:
+        # 保留分块首尾的空白, 保证拼接之后的段落结构与原文一致
+        content = chunk.strip()
+        if not content:
+            return chunk
+        head = chunk[: len(chunk) - len(chunk.lstrip())]
+        tail = chunk[len(chunk.rstrip()) :]
+        return head + translate_text(content).strip() + tail
+
+    if chunked:
+        batch_size = config.get('batch_size', 6000)
+        echo.debug(I18N.translate_py.writefile + out_file)
+        # 分块写入临时文件, 全部成功之后才替换目标文件 (输入和输出可以是同一个文件);
+        # 先关闭输入文件, 再替换目标文件
+        with io.atomic_writer(out_file) as writer:
+            with io.file_reader(in_file) as reader:
+                chunks = iter_text_chunks(reader, batch_size)
+                for index, result in enumerate(
+                    map_concurrently(translate_chunk, chunks, jobs), start=1
+                ):
+                    writer.write(result)
+                    writer.flush()
+                    echo.debug(
+                        replace_vars(
+                            I18N.translate_py.chunkcompleted,
+                            {'index': index, 'size': len(result)},
+                        )
+                    )
+    else:
+        content = io.read_file(in_file)
+        echo.debug(I18N.translate_py.writefile + out_file)
+        if not is_streaming():
+            io.write_file(out_file, translate_text(content))
+        else:
+            # 边接收边写入临时文件, 全部成功之后才替换目标文件
+            with io.atomic_writer(out_file) as writer:
+                streamed = False
+
+                def on_delta(delta: str):
+                    nonlocal streamed
+                    streamed = True
+                    writer.write(delta)
+                    writer.flush()
+
+                def on_restart():
+                    # 重试时丢弃之前写入的不完整的回复
+                    writer.seek(0)
+                    writer.truncate()
+
+                result = translate_text(content, on_delta, on_restart)
+                if not streamed:
+                    writer.write(result)
 
-    result = send_gpt_request(prompt)
+    if cache is not None:
+        prune_cache(cache)
+        cache.close()
 
     echo.debug(I18N.translate_py.translationcompleted)
-    echo.debug(I18N.translate_py.writefile + out_file)
-    io.write_file(out_file, result)
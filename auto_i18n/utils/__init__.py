@@ -1,2 +1,5 @@
+from .concurrent import *  # noqa: F403
 from .object import *  # noqa: F403
+from .profile import *  # noqa: F403
+from .ratelimit import *  # noqa: F403
 from .string import *  # noqa: F403
@@ -0,0 +1,32 @@
+from collections import deque
+from typing import Callable, Iterable, Iterator, TypeVar
+
+__all__ = ['map_concurrently']
+
+T = TypeVar('T')
+R = TypeVar('R')
+
+
+def map_concurrently(
+    func: Callable[[T], R], items: Iterable[T], jobs: int = 1
+) -> Iterator[R]:
+    """在线程池中并发执行 func, 按照 items 的原始顺序返回结果
+
+    最多同时有 jobs 个任务在执行, items 会被惰性消费 (最多预取 2 * jobs 个);
+    jobs <= 1 时直接顺序执行
+    """
+    if jobs is None or jobs <= 1:
+        for item in items:
+            yield func(item)
+        return
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        pending = deque()
+        for item in items:
+            pending.append(executor.submit(func, item))
+            if len(pending) >= jobs * 2:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
@@ -1,3 +1,5 @@
+import sys
+
 import click
 
 
@@ -19,3 +21,14 @@ def warning(msg: str):
 
 def error(msg: str):
     click.echo(click.style(msg, fg='red'))
+
+
+def status(msg: str):
+    """在终端的同一行中刷新显示进度; 输出不是终端时不显示"""
+    if sys.stderr.isatty():
+        click.echo(f'\r\x1b[K{msg}', nl=False, err=True)
+
+
+def clear_status():
+    if sys.stderr.isatty():
+        click.echo('\r\x1b[K', nl=False, err=True)
@@ -1,31 +1,137 @@
-import re
+import hashlib
+import json
 from collections.abc import Mapping
+from typing import Optional
 
-__all__ = ['deep_update', 'diff_objects', 'merge_objects']
+__all__ = [
+    'chunk_objects',
+    'deep_update',
+    'diff_objects',
+    'fingerprint',
+    'fingerprint_object',
+    'flatten_object',
+    'json_size',
+    'merge_objects',
+    'prune_object',
+    'unflatten_object',
+]
 
 
 def deep_update(d, u):
     for k, v in u.items():
         if isinstance(v, Mapping):
-            d[k] = deep_update(d.get(k, {}), v)
+            # 原来的值不是 dict 时 (例如字符串被改为嵌套对象), 整体替换
+            target = d.get(k)
+            d[k] = deep_update(target if isinstance(target, Mapping) else {}, v)
         else:
             d[k] = v
     return d
 
 
-def diff_objects(obj1, obj2):
+def fingerprint(value) -> str:
+    """计算一个值的指纹, 用于判断原文在上次翻译之后是否发生了变化"""
+    data = json.dumps(value, ensure_ascii=False, sort_keys=True)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()[:16]
+
+
+def fingerprint_object(obj: dict) -> dict:
+    """返回与 obj 结构相同的 dict, 其中每个值都替换为它的指纹"""
+    return {
+        key: fingerprint_object(value)
+        if isinstance(value, dict) and value
+        else fingerprint(value)
+        for key, value in obj.items()
+    }
+
+
+def diff_objects(obj1, obj2, fingerprints: Optional[dict] = None):
+    """找出 obj1 中需要同步到 obj2 的部分
+
+    包括 obj2 中缺少的 key, 以及在 obj1 和 obj2 中类型不同 (一边是 dict, 另一边不是) 的 key,
+    后者整体同步; 提供 fingerprints (fingerprint_object 的结果, 记录上次同步时 obj1 中
+    各个值的指纹) 时, 还包括指纹发生了变化的 key。没有记录指纹的 key 视为没有变化
+    """
     diff = {}
     for key, value in obj1.items():
-        if key not in obj2:
+        recorded = fingerprints.get(key) if isinstance(fingerprints, dict) else None
+        if key not in obj2 or isinstance(value, dict) != isinstance(obj2[key], dict):
             diff[key] = value
-        elif isinstance(value, dict) and isinstance(obj2[key], dict):
-            nested_diff = diff_objects(value, obj2[key])
+        elif isinstance(value, dict):
+            nested_diff = diff_objects(
+                value, obj2[key], recorded if isinstance(recorded, dict) else None
+            )
             if nested_diff:
                 diff[key] = nested_diff
-        # elif value != obj2[key]:
-        #     diff[key] = value
+        elif isinstance(recorded, str) and recorded != fingerprint(value):
+            diff[key] = value
     return diff
 
 
+def prune_object(obj: dict, reference: dict) -> dict:
+    """返回 obj 的副本, 删除 reference 中不存在的 key"""
+    pruned = {}
+    for key, value in obj.items():
+        if key not in reference:
+            continue
+        if isinstance(value, dict) and isinstance(reference[key], dict):
+            value = prune_object(value, reference[key])
+        pruned[key] = value
+    return pruned
+
+
 def merge_objects(obj1, obj2):
     return deep_update(obj1.copy(), obj2)
+
+
+def json_size(obj) -> int:
+    return len(json.dumps(obj, ensure_ascii=False))
+
+
+def chunk_objects(obj: dict, max_size: int) -> list[dict]:
+    """将 obj 拆分为若干个 JSON 长度大致不超过 max_size 的子对象
+
+    嵌套的 dict 尽量整体放在同一个分块中; 只有单个 dict 本身超出 max_size 时,
+    才会递归拆分, 拆分出的分块保留原来的上级 key, 便于通过 merge_objects 合并回去
+    """
+    chunks = []
+    current = {}
+    current_size = 2
+    for key, value in obj.items():
+        size = json_size({key: value}) - 1
+        if size > max_size and isinstance(value, dict) and value:
+            overhead = json_size({key: {}})
+            for sub_chunk in chunk_objects(value, max(max_size - overhead, 1)):
+                chunks.append({key: sub_chunk})
+            continue
+        if current and current_size + size > max_size:
+            chunks.append(current)
+            current = {}
+            current_size = 2
+        current[key] = value
+        current_size += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def flatten_object(obj: dict, parent: tuple = ()) -> dict[tuple, object]:
+    """将嵌套的 dict 展开为 {(key1, key2, ...): value} 的形式"""
+    flat = {}
+    for key, value in obj.items():
+        path = parent + (key,)
+        if isinstance(value, dict) and value:
+            flat.update(flatten_object(value, path))
+        else:
+            flat[path] = value
+    return flat
+
+
+def unflatten_object(flat: dict[tuple, object]) -> dict:
+    """flatten_object 的逆操作"""
+    obj = {}
+    for path, value in flat.items():
+        current = obj
+        for key in path[:-1]:
+            current = current.setdefault(key, {})
+        current[path[-1]] = value
+    return obj
@@ -0,0 +1,158 @@
+import functools
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Optional, TypeVar
+
+__all__ = ['PROFILER', 'Profiler', 'percentile', 'profiled']
+
+F = TypeVar('F', bound=Callable)
+
+
+class _Phase:
+    __slots__ = ('calls', 'seconds', 'max_seconds', 'samples')
+
+    def __init__(self):
+        self.calls = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.samples: list[float] = []
+
+
+def percentile(samples: list[float], q: float) -> float:
+    """返回 samples 的第 q (0 ~ 100) 百分位数, 使用线性插值"""
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    position = (len(ordered) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (position - lower)
+
+
+class Profiler:
+    """记录各个阶段的耗时、调用次数以及计数器 (请求数量、prompt 大小、token 用量等)
+
+    默认不启用, 未启用时 phase / count 几乎没有开销; 线程安全。
+    多线程并发执行的阶段, 耗时为各个线程耗时的累加, 可能超过实际经过的时间
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Lock()
+        self._phases: dict[str, _Phase] = {}
+        self._counters: dict[str, int] = {}
+        self._started = time.perf_counter()
+
+    def enable(self):
+        self.enabled = True
+        self._started = time.perf_counter()
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            phase = self._phases.get(name)
+            if phase is None:
+                phase = self._phases[name] = _Phase()
+            phase.calls += 1
+            phase.seconds += seconds
+            phase.max_seconds = max(phase.max_seconds, seconds)
+            phase.samples.append(seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        """记录 with 语句块的耗时"""
+        if not self.enabled:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.record(name, time.perf_counter() - start)
+
+    def count(self, name: str, amount: int = 1):
+        if not self.enabled or not amount:
+            return
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                'elapsed': time.perf_counter() - self._started,
+                'phases': {
+                    name: {
+                        'calls': phase.calls,
+                        'seconds': phase.seconds,
+                        'max_seconds': phase.max_seconds,
+                        'p50': percentile(phase.samples, 50),
+                        'p90': percentile(phase.samples, 90),
+                        'p99': percentile(phase.samples, 99),
+                    }
+                    for name, phase in sorted(self._phases.items())
+                },
+                'counters': dict(sorted(self._counters.items())),
+            }
+
+    def report(self) -> str:
+        """以表格的形式返回 summary"""
+        summary = self.summary()
+        header = ('phase', 'calls', 'total (s)', 'mean (ms)', 'p90 (ms)', 'max (ms)')
+        rows = [header]
+        for name, phase in summary['phases'].items():
+            rows.append(
+                (
+                    name,
+                    str(phase['calls']),
+                    f'{phase["seconds"]:.3f}',
+                    f'{phase["seconds"] / phase["calls"] * 1000:.1f}',
+                    f'{phase["p90"] * 1000:.1f}',
+                    f'{phase["max_seconds"] * 1000:.1f}',
+                )
+            )
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        lines = []
+        for index, row in enumerate(rows):
+            cells = [row[0].ljust(widths[0])]
+            cells += [cell.rjust(width) for cell, width in zip(row[1:], widths[1:])]
+            lines.append('  '.join(cells))
+            if index == 0:
+                lines.append('  '.join('-' * width for width in widths))
+        if summary['counters']:
+            lines.append('')
+            width = max(len(name) for name in summary['counters'])
+            for name, value in summary['counters'].items():
+                lines.append(f'{name.ljust(width)}  {value}')
+        lines.append('')
+        lines.append(f'elapsed: {summary["elapsed"]:.3f}s')
+        return '\n'.join(lines)
+
+    def reset(self):
+        with self._lock:
+            self._phases.clear()
+            self._counters.clear()
+            self._started = time.perf_counter()
+
+
+PROFILER = Profiler()
+
+
+def profiled(name: Optional[str] = None) -> Callable[[F], F]:
+    """装饰器: 将函数的每次调用记录为一个阶段, 阶段名默认为 模块名.函数名"""
+
+    def decorator(func: F) -> F:
+        phase_name = name or f'{func.__module__.rsplit(".", 1)[-1]}.{func.__name__}'
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                PROFILER.record(phase_name, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,77 @@
+import threading
+import time
+from typing import Optional
+
+__all__ = ['RateLimiter', 'estimate_tokens']
+
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计文本的 token 数量 (约 4 个字符一个 token)"""
+    return max(1, len(text) // 4)
+
+
+class _Bucket:
+    """令牌桶, 每分钟补充 per_minute 个令牌; 允许透支, 透支的部分需要等待补充"""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60
+        self.level = per_minute
+        self.updated = time.monotonic()
+
+    def reserve(self, amount: float, now: float) -> float:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+        self.level -= min(amount, self.capacity)
+        return 0.0 if self.level >= 0 else -self.level / self.rate
+
+    def adjust(self, amount: float):
+        self.level = min(self.capacity, self.level - amount)
+
+
+class RateLimiter:
+    """按照每分钟请求数 (rpm) 和每分钟 token 数 (tpm) 限制请求速率
+
+    线程安全; 同时提供同步的 acquire 和异步的 acquire_async。
+    rpm / tpm 为 None 或 0 时表示不限制
+    """
+
+    def __init__(self, rpm: Optional[float] = None, tpm: Optional[float] = None):
+        self._lock = threading.Lock()
+        self._requests = _Bucket(rpm) if rpm else None
+        self._tokens = _Bucket(tpm) if tpm else None
+        self._blocked_until = 0.0
+
+    def reserve(self, tokens: int = 0) -> float:
+        """预约一次请求, 返回需要等待的秒数"""
+        with self._lock:
+            now = time.monotonic()
+            delay = max(0.0, self._blocked_until - now)
+            if self._requests is not None:
+                delay = max(delay, self._requests.reserve(1, now))
+            if self._tokens is not None and tokens:
+                delay = max(delay, self._tokens.reserve(tokens, now))
+            return delay
+
+    def acquire(self, tokens: int = 0):
+        delay = self.reserve(tokens)
+        if delay > 0:
+            time.sleep(delay)
+
+    async def acquire_async(self, tokens: int = 0):
+        import asyncio
+
+        delay = self.reserve(tokens)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    def adjust_tokens(self, tokens: int):
+        """根据实际用量修正之前预约的 token 数量, tokens 为实际值与预估值之差"""
+        if self._tokens is not None and tokens:
+            with self._lock:
+                self._tokens.adjust(tokens)
+
+    def pause(self, seconds: float):
+        """暂停所有请求 seconds 秒, 用于服务端返回 429 时"""
+        with self._lock:
+            self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
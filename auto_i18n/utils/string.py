@@ -1,6 +1,11 @@
 import re
+from typing import Iterable, Iterator, Optional
 
-__all__ = ['ensure_no_md_code_block', 'regex_findall', 'replace_vars']
+__all__ = [
+    'ensure_no_md_code_block',
+    'iter_text_chunks',
+    'replace_vars',
+]
 
 
 def ensure_no_md_code_block(s: str):
@@ -14,10 +19,6 @@ def ensure_no_md_code_block(s: str):
     return s
 
 
-def regex_findall(code: str, pattern: str):
-    return re.findall(pattern, code)
-
-
 def replace_vars(text: str, vars: dict[str, str]):
     """替换文本中的变量
 
@@ -50,3 +51,92 @@ def to_md_list(obj):
         return "\n".join(f"- {key}: {value}" for key, value in obj.items())
     else:
         return str(obj)
+
+
+# 代码块的开始和结束行 (CommonMark): 最多缩进 3 个空格, 至少 3 个连续的 ` 或 ~
+FENCE_OPEN = re.compile(r' {0,3}(`{3,}|~{3,})(.*)')
+FENCE_CLOSE = re.compile(r' {0,3}(`{3,}|~{3,})[ \t]*')
+
+
+def open_fence(line: str) -> Optional[str]:
+    """line 是代码块的开始行时返回其 ` 或 ~ 序列, 否则返回 None"""
+    match = FENCE_OPEN.fullmatch(line.rstrip('\r\n'))
+    if match is None:
+        return None
+    fence, info = match.groups()
+    # ` 代码块的信息字符串中不能包含 `
+    if fence[0] == '`' and '`' in info:
+        return None
+    return fence
+
+
+def closes_fence(line: str, fence: str) -> bool:
+    """line 只包含不少于 fence 长度的同一种字符时, 结束 fence 开始的代码块"""
+    match = FENCE_CLOSE.fullmatch(line.rstrip('\r\n'))
+    return (
+        match is not None
+        and match.group(1)[0] == fence[0]
+        and len(match.group(1)) >= len(fence)
+    )
+
+
+def iter_text_blocks(lines: Iterable[str]) -> Iterator[str]:
+    """按照 Markdown 的结构将文本拆分为块
+
+    - 标题行总是开始一个新的块
+    - 空行结束当前段落, 空行本身归属于前一个块
+    - 代码块 (``` 或 ~~~ 包裹) 整体作为一个块, 不会被拆开; 按照 CommonMark 的规则,
+      只有不少于开始行长度的同一种字符才能结束代码块, 因此 ```` 中可以嵌套 ```
+    """
+    block: list[str] = []
+    fence = None
+    for line in lines:
+        stripped = line.strip()
+        if fence is not None:
+            block.append(line)
+            if closes_fence(line, fence):
+                fence = None
+                yield ''.join(block)
+                block = []
+            continue
+
+        fence = open_fence(line)
+        if fence is not None:
+            if block:
+                yield ''.join(block)
+            block = [line]
+            continue
+
+        if stripped.startswith('#') and block and block[-1].strip():
+            yield ''.join(block)
+            block = []
+
+        if not stripped:
+            block.append(line)
+            continue
+
+        if block and not block[-1].strip():
+            yield ''.join(block)
+            block = []
+        block.append(line)
+
+    if block:
+        yield ''.join(block)
+
+
+def iter_text_chunks(lines: Iterable[str], max_size: int) -> Iterator[str]:
+    """将文本按照结构边界 (见 iter_text_blocks) 拆分为长度大致不超过 max_size 的分块
+
+    lines 会被惰性读取, 可以直接传入打开的文件对象; 单个块超过 max_size 时独立成为一个分块
+    """
+    chunk: list[str] = []
+    size = 0
+    for block in iter_text_blocks(lines):
+        if chunk and size + len(block) > max_size:
+            yield ''.join(chunk)
+            chunk = []
+            size = 0
+        chunk.append(block)
+        size += len(block)
+    if chunk:
+        yield ''.join(chunk)
@@ -0,0 +1,216 @@
+"""离线测量 extract / translate / export 的性能
+
+用法: python benchmarks/bench_pipeline.py [--files 2000] [--latency 0.2] [--fail-rate 0.05]
+
+在临时目录中生成合成项目 (见 synthetic.py), 启动本地的模拟 GPT 服务器 (见 mock_server.py),
+然后依次运行 extract_i18n、translate_i18n 和 export_i18n, 输出每个阶段的耗时、吞吐量
+以及 GPT 请求延迟的百分位数。全局配置写入临时的 HOME 目录, 不会影响本机的配置
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import yaml
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from mock_server import MockServer  # noqa: E402
+from synthetic import DEFAULT_LOCALES, generate_project  # noqa: E402
+
+
+def write_global_config(home: Path, endpoint: str, args):
+    config_dir = home / '.config' / 'auto-i18n'
+    config_dir.mkdir(parents=True, exist_ok=True)
+    config = {
+        'GPT': {
+            'endpoint': endpoint,
+            'key': 'benchmark',
+            'model': 'mock',
+            'max_retries': 5,
+            'stream': args.stream,
+        },
+        'lang': 'en_US',
+        'cache': {'enabled': args.cache},
+    }
+    with open(config_dir / 'global-config.yaml', 'w', encoding='utf-8') as f:
+        yaml.safe_dump(config, f)
+
+
+def run_stage(name: str, func, server: MockServer, units: int, unit_name: str):
+    from auto_i18n.utils import PROFILER
+
+    PROFILER.reset()
+    server.reset_stats()
+    output = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        func()
+    elapsed = time.perf_counter() - start
+
+    summary = PROFILER.summary()
+    request = summary['phases'].get('gpt.request', {})
+    return {
+        'stage': name,
+        'seconds': elapsed,
+        'units': units,
+        'unit': unit_name,
+        'throughput': units / elapsed if elapsed else 0.0,
+        'requests': summary['counters'].get('gpt.requests', 0),
+        'retries': summary['counters'].get('gpt.retries', 0),
+        'tokens': summary['counters'].get('gpt.total_tokens', 0),
+        'p50_ms': request.get('p50', 0.0) * 1000,
+        'p90_ms': request.get('p90', 0.0) * 1000,
+        'p99_ms': request.get('p99', 0.0) * 1000,
+        'server': dict(server.stats),
+        'profile': summary,
+    }
+
+
+def count_keys(obj) -> int:
+    if isinstance(obj, dict):
+        return sum(count_keys(value) for value in obj.values())
+    return 1
+
+
+def print_report(results: list[dict]):
+    header = (
+        f'{"stage":<10}{"time (s)":>10}{"throughput":>20}{"requests":>10}'
+        f'{"retries":>9}{"p50 (ms)":>10}{"p90 (ms)":>10}{"p99 (ms)":>10}'
+    )
+    print(header)
+    print('-' * len(header))
+    for result in results:
+        throughput = f'{result["throughput"]:.1f} {result["unit"]}/s'
+        print(
+            f'{result["stage"]:<10}{result["seconds"]:>10.2f}{throughput:>20}'
+            f'{result["requests"]:>10}{result["retries"]:>9}{result["p50_ms"]:>10.1f}'
+            f'{result["p90_ms"]:>10.1f}{result["p99_ms"]:>10.1f}'
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    group = parser.add_argument_group('synthetic project')
+    group.add_argument('--files', type=int, default=2000)
+    group.add_argument('--depth', type=int, default=4)
+    group.add_argument('--texts-per-file', type=int, default=5)
+    group.add_argument('--main-keys', type=int, default=20000)
+    group.add_argument('--locales', nargs='*', default=DEFAULT_LOCALES)
+    group.add_argument('--translated-ratio', type=float, default=0.9)
+    group.add_argument('--batch-size', type=int, default=6000)
+    group.add_argument('--seed', type=int, default=0)
+
+    group = parser.add_argument_group('mock server')
+    group.add_argument('--latency', type=float, default=0.2)
+    group.add_argument('--jitter', type=float, default=0.2)
+    group.add_argument('--rate-limit-rate', type=float, default=0.0)
+    group.add_argument('--fail-rate', type=float, default=0.0)
+    group.add_argument('--invalid-rate', type=float, default=0.0)
+
+    group = parser.add_argument_group('auto-i18n')
+    group.add_argument('--jobs', '-j', type=int, default=8)
+    group.add_argument('--batch', action='store_true', help='extract --batch')
+    group.add_argument('--multi', action='store_true', help='translate --multi')
+    group.add_argument('--stream', action='store_true', help='GPT.stream')
+    group.add_argument('--cache', action='store_true', help='cache.enabled')
+
+    parser.add_argument('--json', help='save the results to this JSON file')
+    parser.add_argument('--keep', action='store_true', help='keep the temp dir')
+    args = parser.parse_args()
+
+    workdir = Path(tempfile.mkdtemp(prefix='auto-i18n-bench-'))
+    home = workdir / 'home'
+    project = workdir / 'project'
+    # 必须在导入 auto_i18n 之前设置, 全局配置文件的路径在导入时确定
+    os.environ['HOME'] = str(home)
+    os.environ['USERPROFILE'] = str(home)
+    cwd = os.getcwd()
+
+    server = MockServer(
+        latency=args.latency,
+        jitter=args.jitter,
+        rate_limit_rate=args.rate_limit_rate,
+        fail_rate=args.fail_rate,
+        invalid_rate=args.invalid_rate,
+        seed=args.seed,
+    )
+    try:
+        with server:
+            write_global_config(home, server.endpoint, args)
+            start = time.perf_counter()
+            generate_project(
+                project,
+                files=args.files,
+                depth=args.depth,
+                texts_per_file=args.texts_per_file,
+                main_keys=args.main_keys,
+                locales=args.locales,
+                translated_ratio=args.translated_ratio,
+                batch_size=args.batch_size,
+                seed=args.seed,
+            )
+            print(
+                f'Generated {args.files} files and {args.main_keys} keys '
+                f'in {time.perf_counter() - start:.2f}s ({project})'
+            )
+            os.chdir(project)
+
+            from auto_i18n.config import init_global_config
+            from auto_i18n.export import export_i18n
+            from auto_i18n.extract import extract_i18n
+            from auto_i18n.io import read_i18n_file
+            from auto_i18n.translate import translate_i18n
+            from auto_i18n.utils import PROFILER
+
+            # 与 CLI 相同, 用默认值补全全局配置 (prompt 等)
+            init_global_config()
+            PROFILER.enable()
+            results = [
+                run_stage(
+                    'extract',
+                    lambda: extract_i18n('.', args.jobs, args.batch),
+                    server,
+                    args.files,
+                    'files',
+                ),
+            ]
+            main_keys = count_keys(read_i18n_file('src/i18n/zh_CN.yaml'))
+            results.append(
+                run_stage(
+                    'translate',
+                    lambda: translate_i18n(None, args.jobs, args.multi),
+                    server,
+                    main_keys * len(args.locales),
+                    'keys',
+                )
+            )
+            results.append(
+                run_stage(
+                    'export',
+                    lambda: export_i18n('d.ts', Path('.')),
+                    server,
+                    main_keys,
+                    'keys',
+                )
+            )
+    finally:
+        os.chdir(cwd)
+        if not args.keep:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    print_report(results)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,44 @@
+"""测量 CLI 的启动耗时
+
+用法: python benchmarks/bench_startup.py [--runs 20]
+
+每个命令在新的 Python 进程中运行多次, 输出耗时的中位数和最小值 (毫秒)
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+COMMANDS = [
+    ['--help'],
+    ['config', 'get', '--global', 'lang'],
+    ['translate', '--help'],
+]
+
+
+def measure(args: list[str], runs: int) -> list[float]:
+    cmd = [sys.executable, '-c', 'from auto_i18n.cli import cli; cli()', *args]
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(cmd, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        timings.append((time.perf_counter() - start) * 1000)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f'{"command":<40}{"median (ms)":>14}{"min (ms)":>12}')
+    for command in COMMANDS:
+        timings = measure(command, args.runs)
+        name = 'i18n ' + ' '.join(command)
+        print(f'{name:<40}{statistics.median(timings):>14.1f}{min(timings):>12.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,255 @@
+"""兼容 OpenAI chat completion 接口的本地模拟服务器
+
+用法: python benchmarks/mock_server.py [--port 8765] [--latency 0.2] [--fail-rate 0.05]
+
+根据默认 prompt 的格式生成确定性的回复 (autokey、autokeyBatch、translate、translateMulti、
+translateText), 支持流式输出 (stream: true), 可以配置延迟以及注入 429、503 和非法 JSON 回复。
+也可以在其他脚本中通过 MockServer 在后台线程中启动
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+JSON_BLOCK = re.compile(r'```json\n(.*?)\n```', re.S)
+TXT_BLOCK = re.compile(r'```txt\n(.*?)\n```', re.S)
+TARGET_FILES = re.compile(r'one for each of the target files (\[.*?\])')
+TARGET_FILE = re.compile(r'Target language file: (\S+)')
+TEXT_LANG = re.compile(r'specified language: `(.+?)`')
+
+
+def make_key(text: str, index: int) -> str:
+    letters = re.sub(r'[^a-z0-9]', '', text.lower())[:12]
+    return f'{letters or "text"}{index}'
+
+
+def translate_object(obj, lang: str):
+    if isinstance(obj, dict):
+        return {key: translate_object(value, lang) for key, value in obj.items()}
+    return f'[{lang}] {obj}'
+
+
+def reply(prompt: str) -> str:
+    """根据 prompt 的类型生成回复"""
+    targets = TARGET_FILES.search(prompt)
+    block = JSON_BLOCK.search(prompt)
+    if targets and block:
+        source = json.loads(block.group(1))
+        return json.dumps(
+            {
+                name: translate_object(source, name.split('.')[0])
+                for name in json.loads(targets.group(1))
+            },
+            ensure_ascii=False,
+        )
+    if block and '## i18n Text' in prompt:
+        groups = json.loads(block.group(1))
+        return json.dumps(
+            {
+                group: {make_key(text, i): text for i, text in enumerate(texts)}
+                for group, texts in groups.items()
+            },
+            ensure_ascii=False,
+        )
+    if block:
+        target = TARGET_FILE.search(prompt)
+        lang = target.group(1).split('.')[0] if target else 'xx'
+        return json.dumps(
+            translate_object(json.loads(block.group(1)), lang), ensure_ascii=False
+        )
+    block = TXT_BLOCK.search(prompt)
+    if block:
+        lines = block.group(1).split('\n')
+        return json.dumps(
+            {make_key(line, i): line for i, line in enumerate(lines)},
+            ensure_ascii=False,
+        )
+    if '------' in prompt:
+        lang = TEXT_LANG.search(prompt)
+        content = prompt.rsplit('------', 1)[1].strip()
+        return f'[{lang.group(1) if lang else "xx"}] {content}'
+    return 'OK'
+
+
+class MockServer:
+    """在后台线程中运行的模拟服务器
+
+    latency 为每个请求的平均延迟 (秒), jitter 为延迟的随机浮动比例;
+    rate_limit_rate / fail_rate / invalid_rate 分别为返回 429、503 和非法 JSON 的概率
+    """
+
+    def __init__(
+        self,
+        port: int = 0,
+        latency: float = 0.0,
+        jitter: float = 0.2,
+        rate_limit_rate: float = 0.0,
+        fail_rate: float = 0.0,
+        invalid_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_rate = rate_limit_rate
+        self.fail_rate = fail_rate
+        self.invalid_rate = invalid_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.stats = {'requests': 0, 'rate_limited': 0, 'failed': 0, 'invalid': 0}
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), self._handler())
+        self.server.daemon_threads = True
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def endpoint(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}/v1/chat/completions'
+
+    def start(self) -> 'MockServer':
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self) -> 'MockServer':
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def reset_stats(self):
+        with self.lock:
+            for key in self.stats:
+                self.stats[key] = 0
+
+    def _count(self, name: str):
+        with self.lock:
+            self.stats[name] += 1
+
+    def _roll(self, name: str, rate: float) -> bool:
+        """以 rate 的概率注入名为 name 的错误"""
+        with self.lock:
+            hit = rate > 0 and self.random.random() < rate
+            if hit:
+                self.stats[name] += 1
+            return hit
+
+    def _delay(self) -> float:
+        with self.lock:
+            spread = self.latency * self.jitter
+            return max(0.0, self.latency + self.random.uniform(-spread, spread))
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            # 响应头和响应体分两次写入, 不关闭 Nagle 算法时每个请求会多出约 40ms 的延迟
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def send_body(self, status: int, body: bytes = b'', headers=None):
+                self.send_response(status)
+                for key, value in (headers or {}).items():
+                    self.send_header(key, value)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_POST(self):
+                length = int(self.headers.get('Content-Length', 0))
+                data = json.loads(self.rfile.read(length))
+                server._count('requests')
+                time.sleep(server._delay())
+
+                if server._roll('rate_limited', server.rate_limit_rate):
+                    self.send_body(429, headers={'Retry-After': '0'})
+                    return
+                if server._roll('failed', server.fail_rate):
+                    self.send_body(503)
+                    return
+
+                prompt = data['messages'][-1]['content']
+                if server._roll('invalid', server.invalid_rate):
+                    content = 'Sorry, I cannot help with that.'
+                else:
+                    content = reply(prompt)
+                usage = {
+                    'prompt_tokens': len(prompt) // 4,
+                    'completion_tokens': len(content) // 4,
+                    'total_tokens': (len(prompt) + len(content)) // 4,
+                }
+
+                if data.get('stream'):
+                    self.send_stream(content, usage)
+                    return
+
+                body = {
+                    'choices': [{'message': {'role': 'assistant', 'content': content}}],
+                    'usage': usage,
+                }
+                self.send_body(
+                    200,
+                    json.dumps(body).encode('utf-8'),
+                    {'Content-Type': 'application/json'},
+                )
+
+            def send_stream(self, content: str, usage: dict):
+                self.send_response(200)
+                # 与大多数服务端一样不声明 charset, 内容为未转义的 UTF-8
+                self.send_header('Content-Type', 'text/event-stream')
+                self.send_header('Connection', 'close')
+                self.end_headers()
+                events = [
+                    {'choices': [{'delta': {'content': content[i : i + 16]}}]}
+                    for i in range(0, len(content), 16)
+                ]
+                events.append({'choices': [], 'usage': usage})
+                for event in events:
+                    data = json.dumps(event, ensure_ascii=False)
+                    self.wfile.write(f'data: {data}\n\n'.encode('utf-8'))
+                self.wfile.write(b'data: [DONE]\n\n')
+                self.close_connection = True
+
+        return Handler
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.2)
+    parser.add_argument('--jitter', type=float, default=0.2)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--fail-rate', type=float, default=0.0)
+    parser.add_argument('--invalid-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = MockServer(
+        args.port,
+        args.latency,
+        args.jitter,
+        args.rate_limit_rate,
+        args.fail_rate,
+        args.invalid_rate,
+    )
+    print(f'Mock server listening on {server.endpoint}')
+    try:
+        server.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server.server_close()
+
+
+if __name__ == '__main__':
+    main()
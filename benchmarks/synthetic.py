@@ -0,0 +1,157 @@
+"""生成用于性能测试的合成项目
+
+用法: python benchmarks/synthetic.py <目录> [--files 2000] [--depth 4] [--main-keys 20000]
+
+生成的项目包含:
+- auto-i18n.project.yaml
+- src/ 下按 depth 层目录分布的 .ts 代码文件, 每个文件包含若干 ((`文本`)) 标记
+- src/i18n/ 下的主 i18n 文件 (包含 main_keys 个 key, 分布在多层嵌套的命名空间中),
+  以及若干个只翻译了一部分 key 的语言文件
+"""
+
+import argparse
+import random
+from pathlib import Path
+from typing import Optional
+
+import yaml
+
+WORDS = (
+    '保存 取消 确认 删除 编辑 设置 用户 文件 上传 下载 网络 错误 成功 失败 请稍后 重试 '
+    '打开 关闭 搜索 结果 没有 找到 输入 无效 数字 范围 之间 当前 版本 更新 可用 登录 退出'
+).split()
+
+DEFAULT_LOCALES = ['en_US', 'ja_JP', 'fr_FR', 'de_DE']
+
+
+def sentence(rng: random.Random, index: int) -> str:
+    words = rng.sample(WORDS, rng.randint(2, 8))
+    return ' '.join(words) + f' {index}'
+
+
+def build_namespace(
+    rng: random.Random, keys: int, depth: int, fanout: int, counter: list
+) -> dict:
+    """生成包含 keys 个叶子节点、最多 depth 层的嵌套对象"""
+    if depth <= 1 or keys <= fanout:
+        obj = {}
+        for _ in range(keys):
+            counter[0] += 1
+            obj[f'key{counter[0]}'] = sentence(rng, counter[0])
+        return obj
+    obj = {}
+    per_child = -(-keys // fanout)
+    remaining = keys
+    for child in range(fanout):
+        if remaining <= 0:
+            break
+        size = min(per_child, remaining)
+        obj[f'ns{child}'] = build_namespace(rng, size, depth - 1, fanout, counter)
+        remaining -= size
+    return obj
+
+
+def partial_copy(rng: random.Random, obj: dict, ratio: float, lang: str) -> dict:
+    """复制 obj 中大约 ratio 比例的 key, 模拟已经翻译了一部分的语言文件"""
+    result = {}
+    for key, value in obj.items():
+        if isinstance(value, dict):
+            sub = partial_copy(rng, value, ratio, lang)
+            if sub:
+                result[key] = sub
+        elif rng.random() < ratio:
+            result[key] = f'[{lang}] {value}'
+    return result
+
+
+def generate_project(
+    root,
+    files: int = 2000,
+    depth: int = 4,
+    texts_per_file: int = 5,
+    main_keys: int = 20000,
+    locales: Optional[list[str]] = None,
+    translated_ratio: float = 0.9,
+    batch_size: int = 6000,
+    seed: int = 0,
+) -> Path:
+    rng = random.Random(seed)
+    root = Path(root)
+    locales = DEFAULT_LOCALES if locales is None else locales
+
+    src = root / 'src'
+    for index in range(files):
+        parts = [f'dir{rng.randrange(8)}' for _ in range(max(depth - 1, 0))]
+        directory = src.joinpath(*parts)
+        directory.mkdir(parents=True, exist_ok=True)
+        lines = ["import { i18n } from '@/i18n';", '']
+        for line in range(texts_per_file):
+            text = sentence(rng, index * texts_per_file + line)
+            lines.append(f'export const text{line} = ((`{text}`));')
+        # 每隔一个文件放一段没有 i18n 标记的普通代码
+        if index % 2:
+            lines.append('export const plain = () => console.log("no markers here");')
+        (directory / f'module{index}.ts').write_text(
+            '\n'.join(lines) + '\n', encoding='utf-8'
+        )
+
+    i18n_dir = src / 'i18n'
+    i18n_dir.mkdir(parents=True, exist_ok=True)
+    main_i18n = build_namespace(rng, main_keys, depth, 10, [0])
+    dump_yaml(i18n_dir / 'zh_CN.yaml', main_i18n)
+    for lang in locales:
+        dump_yaml(
+            i18n_dir / f'{lang}.yaml',
+            partial_copy(rng, main_i18n, translated_ratio, lang),
+        )
+
+    dump_yaml(
+        root / 'auto-i18n.project.yaml',
+        {
+            'i18n_dir': 'src/i18n',
+            'main_file': 'zh_CN.yaml',
+            'code_files': ['src/**/*.ts'],
+            'i18n_pattern': r'\(\(`(.+?)`\)\)',
+            'dict': {},
+            'strategy': 'diff',
+            'i18n_var_prefix': 'i18n',
+            'i18n_var_mid': 'pathname',
+            'export_dir': '.',
+            'batch_size': batch_size,
+        },
+    )
+    return root
+
+
+def dump_yaml(file_path: Path, data: dict):
+    with open(file_path, 'w', encoding='utf-8') as f:
+        yaml.safe_dump(data, f, allow_unicode=True, sort_keys=False)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('directory')
+    parser.add_argument('--files', type=int, default=2000)
+    parser.add_argument('--depth', type=int, default=4)
+    parser.add_argument('--texts-per-file', type=int, default=5)
+    parser.add_argument('--main-keys', type=int, default=20000)
+    parser.add_argument('--locales', nargs='*', default=DEFAULT_LOCALES)
+    parser.add_argument('--translated-ratio', type=float, default=0.9)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    root = generate_project(
+        args.directory,
+        files=args.files,
+        depth=args.depth,
+        texts_per_file=args.texts_per_file,
+        main_keys=args.main_keys,
+        locales=args.locales,
+        translated_ratio=args.translated_ratio,
+        seed=args.seed,
+    )
+    print(f'Synthetic project generated in {root}')
+
+
+if __name__ == '__main__':
+    main()